@@ -0,0 +1,111 @@
+# benchmarks/chat_inbox.py
+"""Час відповіді GET /chats/ залежно від кількості чатів користувача.
+
+Запуск з каталогу back/ проти БД з застосованими міграціями (DB_HOST, DB_NAME, ... з .env):
+    python -m benchmarks.chat_inbox --sizes 10 50 100 200 500 --repeat 50
+
+Створює користувача з N чатами в транзакції, яку наприкінці відкочує, і викликає сам
+обробник get_user_chats. Для кожного N показує кількість SQL-запитів на виклик (з холодним
+кешем користувачів) і медіану/p95 часу відповіді. Кількість запитів не залежить від N,
+а час росте лише на розбір і серіалізацію рядків списку.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import Response
+
+from auth.database import engine
+from models.models import chat, chat_inbox, user as user_table
+from routes.chats import get_user_chats
+from routes.user_loader import UserLoader, UserSummaryCache
+
+
+def _fake_request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/chats/", "headers": [], "query_string": b""})
+
+
+async def _create_user(session: AsyncSession, name: str) -> int:
+    result = await session.execute(
+        insert(user_table).values(email=f"{name}@bench.invalid", username=name, hashed_password="-",
+                                  registered_at=datetime.utcnow())
+        .returning(user_table.c.id)
+    )
+    return result.scalar_one()
+
+
+async def _add_chats(session: AsyncSession, owner_id: int, count: int, offset: int):
+    now = datetime.utcnow()
+    for n in range(offset, offset + count):
+        partner_id = await _create_user(session, f"bench_partner_{n}")
+        chat_result = await session.execute(
+            insert(chat).values(user1_id=owner_id, user2_id=partner_id, change_seq=n + 1).returning(chat.c.id))
+        chat_id = chat_result.scalar_one()
+        activity_at = now - timedelta(minutes=n)
+        await session.execute(insert(chat_inbox).values([
+            {"user_id": owner_id, "chat_id": chat_id, "partner_id": partner_id, "last_message_id": n + 1,
+             "last_message_sender_id": partner_id, "last_message_preview": "Привіт!" * 10,
+             "last_activity_at": activity_at, "unread_count": n % 5},
+            {"user_id": partner_id, "chat_id": chat_id, "partner_id": owner_id, "last_message_id": n + 1,
+             "last_message_sender_id": partner_id, "last_message_preview": "Привіт!" * 10,
+             "last_activity_at": activity_at, "unread_count": 0},
+        ]))
+
+
+async def _measure(session: AsyncSession, owner, repeat: int, statements: list):
+    timings = []
+    statements_per_call = None
+    for _ in range(repeat):
+        # Холодний кеш: найгірший випадок, коли жоден співрозмовник ще не закешований
+        loader = UserLoader(session, UserSummaryCache())
+        before = len(statements)
+        started = time.perf_counter()
+        chats_data = await get_user_chats(_fake_request(), Response(), session=session,
+                                          user_loader=loader, current_user=owner)
+        timings.append(time.perf_counter() - started)
+        statements_per_call = len(statements) - before
+    timings.sort()
+    return len(chats_data), statements_per_call, timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+async def run(sizes, repeat: int):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        try:
+            session = AsyncSession(bind=connection)
+            owner = SimpleNamespace(id=await _create_user(session, "bench_owner"))
+            print(f"{'chats':>6} {'statements':>10} {'median ms':>10} {'p95 ms':>8}")
+            created = 0
+            for size in sorted(sizes):
+                await _add_chats(session, owner.id, size - created, created)
+                created = size
+                chat_count, statements_per_call, median, p95 = await _measure(session, owner, repeat, statements)
+                print(f"{chat_count:>6} {statements_per_call:>10} {median * 1000:>10.2f} {p95 * 1000:>8.2f}")
+        finally:
+            # Нічого з бенчмарку не лишається в БД
+            await transaction.rollback()
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 200, 500])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/fanout.py
+"""Розсилка однієї події тисячам сокетів, серед яких є повільні.
+
+Запуск з каталогу back/:  python -m benchmarks.fanout --sockets 5000 --slow 50 --messages 300
+
+Показує, скільки займає сам broadcast_to_chat (серіалізація + постановка в черги), за який
+час усі швидкі клієнти отримують усі події та скільки повільних клієнтів відключено
+через переповнення черги. БД не потрібна - використовується InProcessPubSub.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from routes.connection_manager import OUTBOUND_QUEUE_SIZE, ConnectionManager
+from routes.pubsub import InProcessPubSub
+
+CHAT_ID = 1
+
+
+class FakeWebSocket:
+    def __init__(self, send_delay: float):
+        self.send_delay = send_delay
+        self.received = 0
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        # Навіть "швидкий" клієнт поступається циклом подій, як справжній запис у сокет
+        await asyncio.sleep(self.send_delay)
+        self.received += 1
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+async def run(sockets: int, slow: int, messages: int, slow_delay: float):
+    manager = ConnectionManager(InProcessPubSub())
+    fast_sockets = [FakeWebSocket(0) for _ in range(sockets - slow)]
+    slow_sockets = [FakeWebSocket(slow_delay) for _ in range(slow)]
+    for user_id, websocket in enumerate(fast_sockets + slow_sockets):
+        await manager.connect(websocket, user_id, [CHAT_ID])
+
+    payload = {"type": "new_message", "chat_id": CHAT_ID, "content": "x" * 200}
+    broadcast_times = []
+    started = time.perf_counter()
+    for i in range(messages):
+        broadcast_started = time.perf_counter()
+        await manager.broadcast_to_chat({**payload, "id": i}, CHAT_ID)
+        broadcast_times.append(time.perf_counter() - broadcast_started)
+        await asyncio.sleep(0)
+
+    while any(websocket.received < messages for websocket in fast_sockets):
+        await asyncio.sleep(0.001)
+    delivered = time.perf_counter() - started
+
+    evicted = sum(websocket.closed for websocket in slow_sockets)
+    for connections in list(manager.user_connections.values()):
+        for connection in list(connections):
+            manager.disconnect(connection)
+    return sorted(broadcast_times), delivered, evicted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=5000)
+    parser.add_argument("--slow", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=OUTBOUND_QUEUE_SIZE + 50)
+    parser.add_argument("--slow-delay", type=float, default=1.0, help="секунд на одну відправку повільному клієнту")
+    args = parser.parse_args()
+    # Менеджер логує кожне підключення й відключення - у звіті бенчмарку це лише шум
+    with contextlib.redirect_stdout(io.StringIO()):
+        broadcast_times, delivered, evicted = asyncio.run(
+            run(args.sockets, args.slow, args.messages, args.slow_delay))
+    print(f"sockets={args.sockets} slow={args.slow} messages={args.messages} queue={OUTBOUND_QUEUE_SIZE}")
+    print(f"broadcast_to_chat: median {broadcast_times[len(broadcast_times) // 2] * 1000:.2f} ms, "
+          f"max {broadcast_times[-1] * 1000:.2f} ms")
+    print(f"all fast sockets received every event in {delivered * 1000:.0f} ms")
+    print(f"slow sockets evicted: {evicted}/{args.slow}")
+
+
+if __name__ == "__main__":
+    main()
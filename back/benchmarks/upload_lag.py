@@ -0,0 +1,89 @@
+# benchmarks/upload_lag.py
+"""Затримка циклу подій, поки на диск пишеться велике вкладення.
+
+Запуск з каталогу back/:  python -m benchmarks.upload_lag --size-mb 200
+
+Поруч із завантаженням працює задача, що кожну мілісекунду прокидається й міряє, наскільки
+пізніше вона отримала керування, тобто скільки чекали б інші запити цього воркера. Порівнюються
+save_upload_streaming (шматки в пулі потоків) і колишній синхронний shutil.copyfileobj.
+БД не потрібна.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from starlette.datastructures import UploadFile
+
+from routes.file_storage import save_upload_streaming
+
+TICK_SECONDS = 0.001
+
+
+async def _watch_lag(lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK_SECONDS
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+def _make_upload(source_path: str, size: int) -> UploadFile:
+    # Так само, як після розбору multipart: тіло вже лежить у тимчасовому файлі на диску
+    return UploadFile(file=open(source_path, "rb"), size=size, filename="large.bin")
+
+
+async def _copy_synchronously(upload: UploadFile, destination_path: str):
+    with open(destination_path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+
+
+async def _streaming(upload: UploadFile, destination_path: str):
+    await save_upload_streaming(upload, destination_path, max_size=upload.size)
+
+
+async def _measure(name: str, save, source_path: str, size: int, workdir: str):
+    upload = _make_upload(source_path, size)
+    lags = []
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(_watch_lag(lags, stop))
+    await asyncio.sleep(TICK_SECONDS * 5)
+    started = time.perf_counter()
+    try:
+        await save(upload, os.path.join(workdir, name))
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await watcher
+        await upload.close()
+    lags.sort()
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else elapsed
+    worst = lags[-1] if lags else elapsed
+    print(f"{name:>12}: {size / elapsed / 2 ** 20:8.0f} MB/s, event loop lag p99 {p99 * 1000:7.2f} ms, "
+          f"max {worst * 1000:7.2f} ms, ticks {len(lags)}")
+
+
+async def run(size_mb: int):
+    size = size_mb * 2 ** 20
+    with tempfile.TemporaryDirectory() as workdir:
+        source_path = os.path.join(workdir, "source.bin")
+        with open(source_path, "wb") as source:
+            block = os.urandom(2 ** 20)
+            for _ in range(size_mb):
+                source.write(block)
+        print(f"upload size: {size_mb} MB")
+        await _measure("copyfileobj", _copy_synchronously, source_path, size, workdir)
+        await _measure("streaming", _streaming, source_path, size, workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.size_mb))
+
+
+if __name__ == "__main__":
+    main()
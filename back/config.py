@@ -8,3 +8,26 @@ DB_PORT = os.environ.get("DB_PORT")
 DB_NAME = os.environ.get("DB_NAME")
 DB_USER = os.environ.get("DB_USER")
 DB_PASS = os.environ.get("DB_PASS")
+
+# "memory" - події чату лише в межах процесу; "postgres" - LISTEN/NOTIFY між воркерами
+# (так само розсилається й інвалідація кешу публічних відповідей)
+CHAT_PUBSUB_BACKEND = os.environ.get("CHAT_PUBSUB_BACKEND", "memory")
+
+# Кеш публічних відповідей (каталог стартапів, коментарі, задача): записів на воркер і час життя, с
+PUBLIC_CACHE_MAX_ENTRIES = int(os.environ.get("PUBLIC_CACHE_MAX_ENTRIES", 1000))
+PUBLIC_CACHE_TTL_SECONDS = float(os.environ.get("PUBLIC_CACHE_TTL_SECONDS", 60))
+
+# Максимальний розмір вкладення в чаті, байт
+MAX_CHAT_UPLOAD_SIZE = int(os.environ.get("MAX_CHAT_UPLOAD_SIZE", 25 * 1024 * 1024))
+
+# Вкладення чату, завантажені до появи blob-сховища (лише читання та видалення)
+CHAT_LEGACY_UPLOAD_DIR = os.environ.get("CHAT_LEGACY_UPLOAD_DIR", "./uploaded_chat_files")
+
+# Сховище вкладень, адресоване вмістом (SHA-256), спільне для чатів і результатів завдань
+BLOB_STORE_DIR = os.environ.get("BLOB_STORE_DIR", "./blob_store")
+
+# Кількість процесів, що генерують прев'ю зображень і PDF
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", 2))
+
+# Місячні розділи messages, старші за стільки місяців, переносяться в стислий архів (0 - не архівувати)
+MESSAGE_ARCHIVE_AFTER_MONTHS = int(os.environ.get("MESSAGE_ARCHIVE_AFTER_MONTHS", 12))
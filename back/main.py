@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 from fastapi import Depends, FastAPI, File, HTTPException, UploadFile
@@ -26,14 +27,35 @@ from routes.completetask import router as complete_task_router
 from routes.taskresult import router as result_task_router
 from routes.chats import router as chats_router
 from routes.auth_actions import router as auth_actions_router
+from routes.presence import presence_tracker
+from routes.connection_manager import manager as chat_connection_manager
+from routes.thumbnails import router as thumbnails_router, thumbnail_generator
+from routes.message_archive import message_partition_maintainer
+from routes.response_cache import public_cache
 
 fastapi_users = FastAPIUsers[User, int](
     get_user_manager,
     [auth_backend],
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    presence_tracker.start()
+    thumbnail_generator.start()
+    message_partition_maintainer.start()
+    await chat_connection_manager.pubsub.start()
+    await public_cache.pubsub.start()
+    yield
+    await public_cache.pubsub.stop()
+    await chat_connection_manager.pubsub.stop()
+    await message_partition_maintainer.stop()
+    await thumbnail_generator.stop()
+    await presence_tracker.stop()  # Дописуємо останні heartbeat-и в БД
+
+
 app = FastAPI(
-    title="My App"
+    title="My App",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -66,4 +88,5 @@ app.include_router(edit_task_router)
 app.include_router(complete_task_router)
 app.include_router(result_task_router)
 app.include_router(chats_router)
-app.include_router(auth_actions_router)
\ No newline at end of file
+app.include_router(auth_actions_router)
+app.include_router(thumbnails_router)
\ No newline at end of file
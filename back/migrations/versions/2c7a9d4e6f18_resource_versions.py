@@ -0,0 +1,28 @@
+"""Resource versions
+
+Revision ID: 2c7a9d4e6f18
+Revises: 7b4f2c9e1d53
+Create Date: 2026-10-18 15:31:08.527314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c7a9d4e6f18'
+down_revision = '7b4f2c9e1d53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('resource_versions',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('resource_versions')
@@ -0,0 +1,31 @@
+"""Chat inbox indexes
+
+Revision ID: 3f1c9a7d2b64
+Revises: c954b02a0429
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b64'
+down_revision = 'c954b02a0429'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_chats_user1_id', 'chats', ['user1_id'], unique=False)
+    op.create_index('ix_chats_user2_id', 'chats', ['user2_id'], unique=False)
+    op.create_index('ix_messages_chat_id_created_at_id', 'messages', ['chat_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_messages_unread', 'messages', ['chat_id', 'sender_id'], unique=False,
+                    postgresql_where=sa.text('is_read = false'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_unread', table_name='messages')
+    op.drop_index('ix_messages_chat_id_created_at_id', table_name='messages')
+    op.drop_index('ix_chats_user2_id', table_name='chats')
+    op.drop_index('ix_chats_user1_id', table_name='chats')
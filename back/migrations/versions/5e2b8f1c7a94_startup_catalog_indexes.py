@@ -0,0 +1,27 @@
+"""Startup catalog indexes
+
+Revision ID: 5e2b8f1c7a94
+Revises: b93e5d17c4a6
+Create Date: 2026-10-18 17:41:08.527316
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2b8f1c7a94'
+down_revision = 'b93e5d17c4a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_startups_name_id', 'startups', ['name', 'id'], unique=False)
+    op.create_index('ix_startups_owner_id_id', 'startups', ['owner_id', 'id'], unique=False)
+    op.create_index('ix_tasks_startup_id_status', 'tasks', ['startup_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_startup_id_status', table_name='tasks')
+    op.drop_index('ix_startups_owner_id_id', table_name='startups')
+    op.drop_index('ix_startups_name_id', table_name='startups')
@@ -0,0 +1,33 @@
+"""Blob store
+
+Revision ID: 5e8f1b7c3a90
+Revises: d47a0e3b91f2
+Create Date: 2026-10-18 12:37:09.561203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8f1b7c3a90'
+down_revision = 'd47a0e3b91f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('mime_type', sa.String(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    op.add_column('tasks', sa.Column('execution_file_name', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'execution_file_name')
+    op.drop_table('blobs')
@@ -0,0 +1,33 @@
+"""Message search vector
+
+Revision ID: 7b4f2c9e1d53
+Revises: e3d91b5a7c28
+Create Date: 2026-10-18 14:52:16.093448
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '7b4f2c9e1d53'
+down_revision = 'e3d91b5a7c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # STORED-колонка переписує таблицю messages один раз; далі Postgres підтримує її сам при INSERT/UPDATE
+    op.add_column('messages', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('simple', coalesce(content, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(original_file_name, '')), 'B')",
+        persisted=True,
+    ), nullable=True))
+    op.create_index('ix_messages_search_vector', 'messages', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_search_vector', table_name='messages', postgresql_using='gin')
+    op.drop_column('messages', 'search_vector')
@@ -0,0 +1,33 @@
+"""Task updated_at instead of resource versions
+
+Revision ID: 8e3b5f7a1c46
+Revises: a4d6c9e2b815
+Create Date: 2026-10-18 19:12:40.318905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3b5f7a1c46'
+down_revision = 'a4d6c9e2b815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('updated_at', sa.TIMESTAMP(), nullable=True))
+    op.execute('UPDATE tasks SET updated_at = created_at')
+    op.create_index('ix_tasks_updated_at', 'tasks', ['updated_at'], unique=False)
+    op.drop_table('resource_versions')
+
+
+def downgrade() -> None:
+    op.create_table('resource_versions',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.drop_index('ix_tasks_updated_at', table_name='tasks')
+    op.drop_column('tasks', 'updated_at')
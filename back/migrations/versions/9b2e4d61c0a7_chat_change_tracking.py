@@ -0,0 +1,41 @@
+"""Chat change tracking
+
+Revision ID: 9b2e4d61c0a7
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-18 11:04:52.731940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2e4d61c0a7'
+down_revision = '3f1c9a7d2b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('messages', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index('ix_messages_chat_id_change_seq', 'messages', ['chat_id', 'change_seq'], unique=False)
+    op.create_table('message_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.Integer(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.BigInteger(), nullable=False),
+    sa.Column('deleted_at', sa.TIMESTAMP(), nullable=True),
+    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_message_tombstones_chat_id_change_seq', 'message_tombstones', ['chat_id', 'change_seq'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_tombstones_chat_id_change_seq', table_name='message_tombstones')
+    op.drop_table('message_tombstones')
+    op.drop_index('ix_messages_chat_id_change_seq', table_name='messages')
+    op.drop_column('messages', 'change_seq')
+    op.drop_column('chats', 'change_seq')
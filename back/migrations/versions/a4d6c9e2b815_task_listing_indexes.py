@@ -0,0 +1,27 @@
+"""Task listing indexes
+
+Revision ID: a4d6c9e2b815
+Revises: 5e2b8f1c7a94
+Create Date: 2026-10-18 18:05:52.730164
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d6c9e2b815'
+down_revision = '5e2b8f1c7a94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_tasks_status_id', 'tasks', ['status', 'id'], unique=False)
+    op.create_index('ix_tasks_startup_id_id', 'tasks', ['startup_id', 'id'], unique=False)
+    op.create_index('ix_tasks_status_created_at', 'tasks', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_status_created_at', table_name='tasks')
+    op.drop_index('ix_tasks_startup_id_id', table_name='tasks')
+    op.drop_index('ix_tasks_status_id', table_name='tasks')
@@ -0,0 +1,53 @@
+"""Chat read watermarks
+
+Revision ID: a6c2e8f04b17
+Revises: 5e8f1b7c3a90
+Create Date: 2026-10-18 13:24:51.307642
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c2e8f04b17'
+down_revision = '5e8f1b7c3a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('user1_last_read_message_id', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('chats', sa.Column('user2_last_read_message_id', sa.Integer(), server_default='0', nullable=False))
+    # Межа прочитаного = останнє прочитане повідомлення від співрозмовника
+    op.execute("""
+        UPDATE chats SET
+            user1_last_read_message_id = COALESCE((
+                SELECT max(m.id) FROM messages m
+                WHERE m.chat_id = chats.id AND m.sender_id = chats.user2_id AND m.is_read
+            ), 0),
+            user2_last_read_message_id = COALESCE((
+                SELECT max(m.id) FROM messages m
+                WHERE m.chat_id = chats.id AND m.sender_id = chats.user1_id AND m.is_read
+            ), 0)
+    """)
+    op.create_index('ix_messages_chat_id_sender_id_id', 'messages', ['chat_id', 'sender_id', 'id'], unique=False)
+    op.drop_index('ix_messages_unread', table_name='messages', postgresql_where=sa.text('is_read = false'))
+    op.drop_column('messages', 'is_read')
+
+
+def downgrade() -> None:
+    op.add_column('messages', sa.Column('is_read', sa.Boolean(), server_default=sa.false(), nullable=True))
+    op.execute("""
+        UPDATE messages SET is_read = true
+        FROM chats
+        WHERE messages.chat_id = chats.id AND (
+            (messages.sender_id = chats.user1_id AND messages.id <= chats.user2_last_read_message_id)
+            OR (messages.sender_id = chats.user2_id AND messages.id <= chats.user1_last_read_message_id)
+        )
+    """)
+    op.create_index('ix_messages_unread', 'messages', ['chat_id', 'sender_id'], unique=False,
+                    postgresql_where=sa.text('is_read = false'))
+    op.drop_index('ix_messages_chat_id_sender_id_id', table_name='messages')
+    op.drop_column('chats', 'user2_last_read_message_id')
+    op.drop_column('chats', 'user1_last_read_message_id')
@@ -0,0 +1,35 @@
+"""Message client ids
+
+Revision ID: b93e5d17c4a6
+Revises: f1a8c3d5b702
+Create Date: 2026-10-18 17:03:29.611853
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b93e5d17c4a6'
+down_revision = 'f1a8c3d5b702'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('message_client_ids',
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('client_message_id', sa.String(length=64), nullable=False),
+    sa.Column('chat_id', sa.Integer(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ),
+    sa.ForeignKeyConstraint(['sender_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('sender_id', 'client_message_id')
+    )
+    op.create_index('ix_message_client_ids_created_at', 'message_client_ids', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_client_ids_created_at', table_name='message_client_ids')
+    op.drop_table('message_client_ids')
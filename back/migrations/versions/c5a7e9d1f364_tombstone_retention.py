@@ -0,0 +1,26 @@
+"""Tombstone retention
+
+Revision ID: c5a7e9d1f364
+Revises: 8e3b5f7a1c46
+Create Date: 2026-10-18 19:48:21.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a7e9d1f364'
+down_revision = '8e3b5f7a1c46'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('tombstones_purged_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index('ix_message_tombstones_deleted_at', 'message_tombstones', ['deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_tombstones_deleted_at', table_name='message_tombstones')
+    op.drop_column('chats', 'tombstones_purged_seq')
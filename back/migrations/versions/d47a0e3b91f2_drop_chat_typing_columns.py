@@ -0,0 +1,27 @@
+"""Drop chat typing columns
+
+Revision ID: d47a0e3b91f2
+Revises: 9b2e4d61c0a7
+Create Date: 2026-10-18 11:48:20.115386
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd47a0e3b91f2'
+down_revision = '9b2e4d61c0a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Стан "друкує..." тепер живе в пам'яті (routes/typing_state.py)
+    op.drop_column('chats', 'user2_last_typing_at')
+    op.drop_column('chats', 'user1_last_typing_at')
+
+
+def downgrade() -> None:
+    op.add_column('chats', sa.Column('user1_last_typing_at', sa.TIMESTAMP(), nullable=True))
+    op.add_column('chats', sa.Column('user2_last_typing_at', sa.TIMESTAMP(), nullable=True))
@@ -0,0 +1,68 @@
+"""Chat inbox
+
+Revision ID: e3d91b5a7c28
+Revises: a6c2e8f04b17
+Create Date: 2026-10-18 14:05:37.842119
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3d91b5a7c28'
+down_revision = 'a6c2e8f04b17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('chat_inbox',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.Integer(), nullable=False),
+    sa.Column('partner_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_id', sa.Integer(), nullable=True),
+    sa.Column('last_message_sender_id', sa.Integer(), nullable=True),
+    sa.Column('last_message_preview', sa.String(), nullable=True),
+    sa.Column('last_activity_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ),
+    sa.ForeignKeyConstraint(['partner_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'chat_id')
+    )
+    op.create_index('ix_chat_inbox_user_id_last_activity_at', 'chat_inbox',
+                    ['user_id', sa.text('last_activity_at DESC NULLS LAST'), sa.text('chat_id DESC')], unique=False)
+    # Заповнюємо з наявних повідомлень; прев'ю - те саме, що будує routes/chat_inbox.build_last_message_snippet
+    op.execute("""
+        INSERT INTO chat_inbox (user_id, chat_id, partner_id, last_message_id, last_message_sender_id,
+                                last_message_preview, last_activity_at, unread_count)
+        SELECT p.user_id, c.id, p.partner_id, lm.id, lm.sender_id,
+               CASE
+                   WHEN lm.id IS NULL THEN NULL
+                   WHEN COALESCE(lm.content, '') <> '' THEN
+                       CASE WHEN length(lm.content) > 40 THEN left(lm.content, 40) || '...' ELSE lm.content END
+                   WHEN COALESCE(lm.original_file_name, '') <> '' THEN
+                       'Файл: ' || left(lm.original_file_name, 30)
+                       || CASE WHEN length(lm.original_file_name) > 30 THEN '...' ELSE '' END
+                   ELSE 'Повідомлення без тексту'
+               END,
+               COALESCE(lm.updated_at, lm.created_at),
+               (SELECT count(m.id) FROM messages m
+                WHERE m.chat_id = c.id AND m.sender_id = p.partner_id AND m.id > p.last_read_message_id)
+        FROM chats c
+        CROSS JOIN LATERAL (VALUES (c.user1_id, c.user2_id, c.user1_last_read_message_id),
+                                   (c.user2_id, c.user1_id, c.user2_last_read_message_id))
+            AS p(user_id, partner_id, last_read_message_id)
+        LEFT JOIN LATERAL (
+            SELECT id, sender_id, content, original_file_name, created_at, updated_at
+            FROM messages WHERE chat_id = c.id
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1
+        ) lm ON true
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_inbox_user_id_last_activity_at', table_name='chat_inbox')
+    op.drop_table('chat_inbox')
@@ -0,0 +1,145 @@
+"""Partition messages by month
+
+Revision ID: f1a8c3d5b702
+Revises: 2c7a9d4e6f18
+Create Date: 2026-10-18 16:12:44.190582
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a8c3d5b702'
+down_revision = '2c7a9d4e6f18'
+branch_labels = None
+depends_on = None
+
+MESSAGE_INDEXES = [
+    ('ix_messages_chat_id_created_at_id', ['chat_id', 'created_at', 'id'], {}),
+    ('ix_messages_chat_id_change_seq', ['chat_id', 'change_seq'], {}),
+    ('ix_messages_chat_id_sender_id_id', ['chat_id', 'sender_id', 'id'], {}),
+    ('ix_messages_search_vector', ['search_vector'], {'postgresql_using': 'gin'}),
+]
+MESSAGE_COLUMNS = ('id, chat_id, sender_id, content, created_at, file_path, original_file_name, mime_type, '
+                   'updated_at, is_edited, change_seq')
+
+
+def _message_columns(id_default):
+    return [
+        sa.Column('id', sa.Integer(), server_default=id_default, nullable=False),
+        sa.Column('chat_id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('file_path', sa.String(), nullable=True),
+        sa.Column('original_file_name', sa.String(), nullable=True),
+        sa.Column('mime_type', sa.String(), nullable=True),
+        sa.Column('updated_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('is_edited', sa.Boolean(), nullable=True),
+        sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+            "setweight(to_tsvector('simple', coalesce(content, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(original_file_name, '')), 'B')",
+            persisted=True,
+        ), nullable=True),
+        sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ),
+        sa.ForeignKeyConstraint(['sender_id'], ['user.id'], ),
+    ]
+
+
+def _move_messages_aside():
+    # Імена індексів і первинного ключа глобальні в схемі - звільняємо їх для нової таблиці
+    op.rename_table('messages', 'messages_old')
+    op.execute('ALTER TABLE messages_old RENAME CONSTRAINT messages_pkey TO messages_old_pkey')
+    for name, _, kwargs in MESSAGE_INDEXES:
+        op.drop_index(name, table_name='messages_old', **kwargs)
+
+
+def _create_message_indexes():
+    for name, columns, kwargs in MESSAGE_INDEXES:
+        op.create_index(name, 'messages', columns, unique=False, **kwargs)
+
+
+def upgrade() -> None:
+    _move_messages_aside()
+
+    op.create_table('messages',
+    *_message_columns(sa.text("nextval('messages_id_seq'::regclass)")),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    # Розділи від найстарішого повідомлення до двох місяців наперед; далі їх створює routes/message_archive.py.
+    # DEFAULT-розділ приймає рядки, для місяця яких розділу ще немає, щоб INSERT ніколи не падав
+    op.execute("""
+        DO $$
+        DECLARE
+            month_start date := date_trunc('month', COALESCE((SELECT min(created_at) FROM messages_old),
+                                                             now() AT TIME ZONE 'utc'));
+            last_month date := date_trunc('month', now() AT TIME ZONE 'utc') + interval '2 months';
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                EXECUTE format('CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                               'messages_p' || to_char(month_start, 'YYYYMM'),
+                               month_start, (month_start + interval '1 month')::date);
+                month_start := month_start + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+    op.execute('CREATE TABLE messages_default PARTITION OF messages DEFAULT')
+
+    # created_at тепер ключ розділення і не може бути NULL
+    op.execute(f"""
+        INSERT INTO messages ({MESSAGE_COLUMNS})
+        SELECT id, chat_id, sender_id, content, COALESCE(created_at, now() AT TIME ZONE 'utc'), file_path,
+               original_file_name, mime_type, updated_at, is_edited, change_seq
+        FROM messages_old
+    """)
+    op.execute('ALTER SEQUENCE messages_id_seq OWNED BY messages.id')
+    op.drop_table('messages_old')
+    # Індекс на розділеній таблиці створюється в кожному розділі; будуємо після копіювання - так швидше
+    _create_message_indexes()
+
+    op.create_table('message_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.Integer(), nullable=False),
+    sa.Column('period_start', sa.TIMESTAMP(), nullable=False),
+    sa.Column('first_message_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_id', sa.Integer(), nullable=False),
+    sa.Column('first_created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('last_created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.Column('messages', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('file_paths', postgresql.ARRAY(sa.String()), server_default='{}', nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_message_archive_chat_id_last_message_id', 'message_archive',
+                    ['chat_id', 'last_message_id'], unique=False)
+
+
+def downgrade() -> None:
+    _move_messages_aside()
+
+    op.create_table('messages',
+    *_message_columns(sa.text("nextval('messages_id_seq'::regclass)")),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f'INSERT INTO messages ({MESSAGE_COLUMNS}) SELECT {MESSAGE_COLUMNS} FROM messages_old')
+    # Повертаємо й заархівовані повідомлення
+    op.execute(f"""
+        INSERT INTO messages ({MESSAGE_COLUMNS})
+        SELECT m.id, a.chat_id, m.sender_id, m.content, m.created_at, m.file_path, m.original_file_name,
+               m.mime_type, m.updated_at, m.is_edited, 0
+        FROM message_archive a
+        CROSS JOIN LATERAL jsonb_to_recordset(a.messages) AS m(
+            id integer, sender_id integer, content text, created_at timestamp, file_path varchar,
+            original_file_name varchar, mime_type varchar, updated_at timestamp, is_edited boolean)
+    """)
+    op.execute('ALTER SEQUENCE messages_id_seq OWNED BY messages.id')
+    op.drop_table('messages_old')  # Разом з усіма розділами
+    _create_message_indexes()
+
+    op.drop_index('ix_message_archive_chat_id_last_message_id', table_name='message_archive')
+    op.drop_table('message_archive')
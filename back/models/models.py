@@ -1,6 +1,7 @@
 from datetime import datetime
-from sqlalchemy import MetaData, Table, Column, Integer, String, JSON, TIMESTAMP, ForeignKey, Boolean, Text, DateTime
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, Table, Column, Integer, String, JSON, TIMESTAMP, ForeignKey, Boolean, Text, DateTime, Index, text, BigInteger
+from sqlalchemy import create_engine, Computed
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 
 metadata = MetaData()
 
@@ -33,6 +34,9 @@ startup = Table(
     Column("description", Text, nullable=True),
     Column("created_at", TIMESTAMP, default=datetime.utcnow),
     Column("owner_id", Integer, ForeignKey("user.id")),
+    # Ключі сортування каталогу /startups/: курсор іде по (name, id) або по id в межах власника
+    Index("ix_startups_name_id", "name", "id"),
+    Index("ix_startups_owner_id_id", "owner_id", "id"),
 )
 
 task = Table(
@@ -47,6 +51,17 @@ task = Table(
     Column("executor_id", Integer, ForeignKey("user.id"), nullable=True),
     Column("execution_description", Text, nullable=True),
     Column("execution_image", String, nullable=True),
+    Column("execution_file_name", String, nullable=True),
+    # Час останньої зміни; Core ставить його на кожен insert/update задачі. Разом із count(*) і max(id)
+    # дає ETag списку /tasks/ без окремого лічильника, який блокував би всі записи задач
+    Column("updated_at", TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow),
+    # Задачі сторінки каталогу та фільтри за статусом задач стартапу
+    Index("ix_tasks_startup_id_status", "startup_id", "status"),
+    # Сторінки /tasks/: курсор по id у межах статусу або стартапу, фільтр за датою в межах статусу
+    Index("ix_tasks_status_id", "status", "id"),
+    Index("ix_tasks_startup_id_id", "startup_id", "id"),
+    Index("ix_tasks_status_created_at", "status", "created_at"),
+    Index("ix_tasks_updated_at", "updated_at"),
 )
 
 chat = Table(
@@ -56,23 +71,112 @@ chat = Table(
     Column("user1_id", Integer, ForeignKey("user.id"), nullable=False),
     Column("user2_id", Integer, ForeignKey("user.id"), nullable=False),
     Column("created_at", TIMESTAMP, default=datetime.utcnow),
-    Column("user1_last_typing_at", TIMESTAMP, nullable=True),
-    Column("user2_last_typing_at", TIMESTAMP, nullable=True),
+    # Лічильник змін чату: кожна зміна повідомлень отримує наступне значення (див. /chats/{chat_id}/sync)
+    Column("change_seq", BigInteger, nullable=False, default=0, server_default="0"),
+    # Межа прочитаного: учасник прочитав усі повідомлення з id <= цього значення
+    Column("user1_last_read_message_id", Integer, nullable=False, default=0, server_default="0"),
+    Column("user2_last_read_message_id", Integer, nullable=False, default=0, server_default="0"),
+    # Найбільший change_seq видалених зі старості tombstone-ів: /sync з since нижче за нього не знає всіх видалень
+    Column("tombstones_purged_seq", BigInteger, nullable=False, default=0, server_default="0"),
+    Index("ix_chats_user1_id", "user1_id"),
+    Index("ix_chats_user2_id", "user2_id"),
 )
 
+# Розділена по місяцях за created_at (RANGE): кожен місяць - окрема таблиця messages_pYYYYMM зі своїми
+# індексами, тож VACUUM і перебудова індексів працюють з одним місяцем, а не з усією історією.
+# Ключ розділення мусить входити в первинний ключ; розділи створює й архівує routes/message_archive.py
 message = Table(
     "messages", metadata,
-    Column("id", Integer, primary_key=True),
+    Column("id", Integer, primary_key=True, autoincrement=True),
     Column("chat_id", Integer, ForeignKey("chats.id"), nullable=False),
     Column("sender_id", Integer, ForeignKey("user.id"), nullable=False),
     Column("content", Text, nullable=True),
-    Column("created_at", DateTime, default=datetime.utcnow),
-    Column("is_read", Boolean, default=False),
+    Column("created_at", DateTime, primary_key=True, default=datetime.utcnow),
     Column("file_path", String, nullable=True),
     Column("original_file_name", String, nullable=True),
     Column("mime_type", String, nullable=True),
     Column("updated_at", TIMESTAMP, nullable=True),
-    Column("is_edited", Boolean, default=False, nullable=True)
+    Column("is_edited", Boolean, default=False, nullable=True),
+    Column("change_seq", BigInteger, nullable=False, default=0, server_default="0"),
+    # Повнотекстовий пошук (/chats/search): конфігурація 'simple' без стемінгу, бо українського словника
+    # в стандартному Postgres немає; назва файлу має меншу вагу за текст
+    Column("search_vector", TSVECTOR, Computed(
+        "setweight(to_tsvector('simple', coalesce(content, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(original_file_name, '')), 'B')",
+        persisted=True,
+    )),
+    Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+    Index("ix_messages_chat_id_change_seq", "chat_id", "change_seq"),
+    # Кількість непрочитаних = діапазон id вище межі прочитаного для повідомлень співрозмовника
+    Index("ix_messages_chat_id_sender_id_id", "chat_id", "sender_id", "id"),
+    Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+    postgresql_partition_by="RANGE (created_at)",
+)
+
+# Ідентифікатори, які клієнт генерує для повідомлень з офлайн-черги: повторна відправка того самого пакета
+# не створює дублікатів. Окрема таблиця, бо унікальний ключ розділеної messages мусив би містити created_at
+message_client_id = Table(
+    "message_client_ids", metadata,
+    Column("sender_id", Integer, ForeignKey("user.id"), primary_key=True),
+    Column("client_message_id", String(64), primary_key=True),
+    Column("chat_id", Integer, ForeignKey("chats.id"), nullable=False),
+    Column("message_id", Integer, nullable=False),
+    Column("created_at", TIMESTAMP, nullable=False, default=datetime.utcnow),
+    Index("ix_message_client_ids_created_at", "created_at"),
+)
+
+# Холодна історія: старі місячні розділи messages переносяться сюди шматками по кілька сотень повідомлень
+# одного чату. messages - JSONB-масив, який Postgres стискає в TOAST; file_paths тримають посилання на вкладення
+message_archive = Table(
+    "message_archive", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("chat_id", Integer, ForeignKey("chats.id"), nullable=False),
+    Column("period_start", TIMESTAMP, nullable=False),  # Перший день місяця, з якого цей шматок
+    Column("first_message_id", Integer, nullable=False),
+    Column("last_message_id", Integer, nullable=False),
+    Column("first_created_at", TIMESTAMP, nullable=False),
+    Column("last_created_at", TIMESTAMP, nullable=False),
+    Column("message_count", Integer, nullable=False),
+    Column("messages", JSONB, nullable=False),
+    Column("file_paths", ARRAY(String), nullable=False, server_default="{}"),
+    Index("ix_message_archive_chat_id_last_message_id", "chat_id", "last_message_id"),
+)
+
+message_tombstone = Table(
+    "message_tombstones", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("chat_id", Integer, ForeignKey("chats.id"), nullable=False),
+    Column("message_id", Integer, nullable=False),
+    Column("change_seq", BigInteger, nullable=False),
+    Column("deleted_at", TIMESTAMP, default=datetime.utcnow),
+    Index("ix_message_tombstones_chat_id_change_seq", "chat_id", "change_seq"),
+    Index("ix_message_tombstones_deleted_at", "deleted_at"),
+)
+
+# Денормалізований список чатів: по рядку на (учасник, чат), оновлюється в тій самій транзакції,
+# що й повідомлення (routes/chat_inbox.py), тож GET /chats/ не торкається таблиці messages
+chat_inbox = Table(
+    "chat_inbox", metadata,
+    Column("user_id", Integer, ForeignKey("user.id"), primary_key=True),
+    Column("chat_id", Integer, ForeignKey("chats.id"), primary_key=True),
+    Column("partner_id", Integer, ForeignKey("user.id"), nullable=False),
+    Column("last_message_id", Integer, nullable=True),
+    Column("last_message_sender_id", Integer, nullable=True),
+    Column("last_message_preview", String, nullable=True),
+    Column("last_activity_at", TIMESTAMP, nullable=True),
+    Column("unread_count", Integer, nullable=False, default=0, server_default="0"),
+    Index("ix_chat_inbox_user_id_last_activity_at", "user_id",
+          text("last_activity_at DESC NULLS LAST"), text("chat_id DESC")),
+)
+
+blob = Table(
+    "blobs", metadata,
+    Column("sha256", String(64), primary_key=True),
+    Column("size", BigInteger, nullable=False),
+    Column("mime_type", String, nullable=True),
+    # Кількість повідомлень/завдань, що посилаються на файл; при 0 файл видаляє збирач сміття
+    Column("ref_count", Integer, nullable=False, default=0),
+    Column("created_at", TIMESTAMP, default=datetime.utcnow),
 )
 
 rating = Table(
@@ -8,6 +8,7 @@ from datetime import datetime # Потрібно, якщо будете вико
 # Переконайтеся, що User - це Pydantic модель, а user_table - SQLAlchemy таблиця
 from auth.database import get_async_session, User
 from models.models import user as user_table
+from routes.presence import presence_tracker
 
 # Імпортуйте ваш FastAPIUsers інстанс або його компоненти
 from auth.manager import get_user_manager
@@ -46,4 +47,5 @@ async def logout_explicit_action(
     )
     await session.execute(stmt)
     await session.commit()
+    presence_tracker.forget(current_user.id)
     return {"message": "User marked as offline successfully"}
\ No newline at end of file
@@ -0,0 +1,22 @@
+# routes/batch_loading.py
+from typing import Any, Dict, Hashable, Iterable, List
+
+from sqlalchemy import ColumnElement, Select
+from sqlalchemy.engine import RowMapping
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def load_grouped(session: AsyncSession, query: Select, key_column: ColumnElement,
+                       keys: Iterable[Hashable]) -> Dict[Any, List[RowMapping]]:
+    """Один запит WHERE key_column IN (...) замість окремого запиту на кожен ключ.
+
+    key_column має бути серед колонок query. Повертає рядки, згруповані за ключем у порядку
+    ORDER BY запиту; ключі без рядків отримують порожній список.
+    """
+    grouped: Dict[Any, List[RowMapping]] = {key: [] for key in keys}
+    if not grouped:
+        return grouped
+    result = await session.execute(query.where(key_column.in_(list(grouped))))
+    for row in result.mappings():
+        grouped[row[key_column.key]].append(row)
+    return grouped
@@ -0,0 +1,133 @@
+# routes/blob_store.py
+import os
+import re
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional
+
+from fastapi import UploadFile
+from sqlalchemy import update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from auth.database import async_session_maker
+from config import BLOB_STORE_DIR
+from models.models import blob
+from routes.file_storage import save_upload_streaming
+
+BLOB_TMP_DIR = os.path.join(BLOB_STORE_DIR, "tmp")
+BLOB_THUMBNAIL_DIR = os.path.join(BLOB_STORE_DIR, "thumbnails")
+os.makedirs(BLOB_TMP_DIR, exist_ok=True)
+
+# Довша сторона прев'ю в пікселях: 240 - бульбашка в чаті (до 220px), 480 - та сама бульбашка на HiDPI-екрані
+THUMBNAIL_SIZES = (240, 480)
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class StagedBlob(NamedTuple):
+    temp_path: str
+    size: int
+    sha256: str
+
+
+def blob_path(sha256: str) -> str:
+    # Двобайтове шардування (ab/cd/abcd...), щоб у жодній теці не накопичувались сотні тисяч файлів
+    return os.path.join(BLOB_STORE_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def thumbnail_path(sha256: str, size: int) -> str:
+    # Прев'ю, як і оригінал, адресуються хешем вмісту - дублікати отримують їх безкоштовно
+    return os.path.join(BLOB_THUMBNAIL_DIR, sha256[:2], f"{sha256}_{size}.webp")
+
+
+def storage_name(sha256: str, original_file_name: Optional[str]) -> str:
+    """Ім'я, яке зберігається в messages.file_path / tasks.execution_image: хеш + розширення оригіналу."""
+    extension = os.path.splitext(original_file_name or "")[1].lower()
+    return f"{sha256}{extension}"
+
+
+def parse_storage_name(name: Optional[str]) -> Optional[str]:
+    """Повертає SHA-256 для імені з blob-сховища або None для старих файлів (UUID / name_timestamp)."""
+    if not name:
+        return None
+    sha256 = os.path.splitext(os.path.basename(name))[0]
+    return sha256 if _SHA256_RE.match(sha256) else None
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _place_blob_file(temp_path: str, final_path: str):
+    if os.path.exists(final_path):
+        os.remove(temp_path)  # Такий самий вміст уже лежить у сховищі
+        return
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(temp_path, final_path)
+
+
+async def stage_upload(upload: UploadFile, max_size: int) -> StagedBlob:
+    """Стрімить завантаження в тимчасовий файл, отримуючи хеш, під яким воно ляже в сховище."""
+    temp_path = os.path.join(BLOB_TMP_DIR, uuid.uuid4().hex)
+    stored = await save_upload_streaming(upload, temp_path, max_size)
+    return StagedBlob(temp_path=temp_path, size=stored.size, sha256=stored.sha256)
+
+
+async def discard_staged(staged: Optional[StagedBlob]):
+    if staged:
+        await run_in_threadpool(_remove_quietly, staged.temp_path)
+
+
+async def acquire_blob(session: AsyncSession, staged: StagedBlob, mime_type: Optional[str]):
+    """+1 посилання на blob у транзакції викликача. Після коміту викликач має зробити place_blob.
+
+    Файл не чіпаємо до коміту: після відкату в сховищі не лишиться файлу без рядка.
+    Збирач сміття видаляє лише blob-и без посилань, тож після нашого коміту файл уже не зачепить,
+    а якщо видалив його раніше - place_blob покладе файл заново.
+    """
+    await session.execute(
+        pg_insert(blob)
+        .values(sha256=staged.sha256, size=staged.size, mime_type=mime_type, ref_count=1,
+                created_at=datetime.utcnow())
+        .on_conflict_do_update(index_elements=[blob.c.sha256], set_={"ref_count": blob.c.ref_count + 1})
+    )
+
+
+async def place_blob(staged: StagedBlob):
+    """Переносить тимчасовий файл у сховище; викликати після коміту транзакції з acquire_blob."""
+    await run_in_threadpool(_place_blob_file, staged.temp_path, blob_path(staged.sha256))
+
+
+async def release_blobs(session: AsyncSession, names: Iterable[Optional[str]]) -> List[str]:
+    """-1 посилання для кожного імені з blob-сховища; повертає хеші для collect_garbage після коміту."""
+    released = Counter(sha256 for sha256 in map(parse_storage_name, names) if sha256)
+    for sha256, references in released.items():
+        await session.execute(
+            update(blob).where(blob.c.sha256 == sha256).values(ref_count=blob.c.ref_count - references)
+        )
+    return list(released)
+
+
+async def collect_garbage(sha256_list: Optional[List[str]] = None):
+    """Видаляє blob-и без посилань. Без аргументів - повний прохід по всьому сховищу."""
+    async with async_session_maker() as session:
+        stmt = delete(blob).where(blob.c.ref_count <= 0)
+        if sha256_list is not None:
+            if not sha256_list:
+                return
+            stmt = stmt.where(blob.c.sha256.in_(sha256_list))
+        result = await session.execute(stmt.returning(blob.c.sha256))
+        # Файли видаляємо до коміту: паралельний acquire_blob чекає на блокування рядка
+        # і після нашого коміту вставить рядок та покладе файл заново
+        for sha256 in result.scalars().all():
+            await run_in_threadpool(_remove_quietly, blob_path(sha256))
+            for size in THUMBNAIL_SIZES:
+                await run_in_threadpool(_remove_quietly, thumbnail_path(sha256, size))
+        await session.commit()
+
@@ -0,0 +1,60 @@
+# routes/chat_deletion.py
+import os
+from typing import Iterable, List, NamedTuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import CHAT_LEGACY_UPLOAD_DIR
+from models.models import chat, message, message_archive, message_client_id, message_tombstone
+from routes.blob_store import collect_garbage, parse_storage_name, release_blobs
+from routes.chat_inbox import delete_inbox_rows
+from routes.connection_manager import manager
+
+
+class DeletedChats(NamedTuple):
+    chat_ids: List[int]
+    released_blobs: List[str]  # Blob-и, що втратили останнє посилання
+    legacy_files: List[str]  # Вкладення з часів до blob-сховища
+
+
+async def delete_chats(session: AsyncSession, chat_ids: Iterable[int]) -> DeletedChats:
+    """Видаляє чати разом з усім, що на них посилається; commit робить викликач.
+
+    Після commit результат треба передати в finish_chat_deletion - лише тоді
+    файли зникають з диска, а клієнти дізнаються про видалення.
+    """
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return DeletedChats([], [], [])
+
+    messages_result = await session.execute(select(message.c.file_path).where(message.c.chat_id.in_(chat_ids)))
+    attachment_paths = [file_path for file_path in messages_result.scalars() if file_path]
+    # Заархівовані повідомлення теж тримають посилання на вкладення
+    archived_paths_result = await session.execute(
+        select(message_archive.c.file_paths).where(message_archive.c.chat_id.in_(chat_ids)))
+    for archived_paths in archived_paths_result.scalars():
+        attachment_paths.extend(archived_paths)
+    # Файли з blob-сховища можуть бути спільними з іншими повідомленнями - лише зменшуємо лічильник
+    released_blobs = await release_blobs(session, attachment_paths)
+
+    await session.execute(delete(message).where(message.c.chat_id.in_(chat_ids)))
+    await session.execute(delete(message_tombstone).where(message_tombstone.c.chat_id.in_(chat_ids)))
+    await session.execute(delete(message_archive).where(message_archive.c.chat_id.in_(chat_ids)))
+    await session.execute(delete(message_client_id).where(message_client_id.c.chat_id.in_(chat_ids)))
+    await delete_inbox_rows(session, chat_ids)
+    await session.execute(delete(chat).where(chat.c.id.in_(chat_ids)))
+
+    legacy_files = [path for path in attachment_paths if not parse_storage_name(path)]
+    return DeletedChats(chat_ids, released_blobs, legacy_files)
+
+
+async def finish_chat_deletion(deleted: DeletedChats):
+    await collect_garbage(deleted.released_blobs)
+    for legacy_file in deleted.legacy_files:
+        try:
+            os.remove(os.path.join(CHAT_LEGACY_UPLOAD_DIR, legacy_file))
+        except OSError:
+            pass  # Файл уже видалено або його не було
+    for chat_id in deleted.chat_ids:
+        await manager.close_chat(chat_id, {"type": "chat_deleted", "chat_id": chat_id})
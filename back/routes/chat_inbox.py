@@ -0,0 +1,110 @@
+# routes/chat_inbox.py
+from typing import Optional
+
+from sqlalchemy import insert, select, update, delete, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import chat, message, chat_inbox
+
+
+# Усі функції викликаються в транзакції, яка вже тримає блокування рядка чату
+# (next_chat_change_seq або UPDATE межі прочитаного), тому зміни одного чату не перемішуються.
+
+
+def build_last_message_snippet(content: Optional[str], file_name_snippet: Optional[str]) -> str:
+    if content:
+        return content[:40] + "..." if len(content) > 40 else content
+    if file_name_snippet:
+        last_message_snippet = f"Файл: {file_name_snippet[:30]}"
+        if len(file_name_snippet) > 30: last_message_snippet += "..."
+        return last_message_snippet
+    return "Повідомлення без тексту"
+
+
+def _last_message_values(msg_row) -> dict:
+    if msg_row is None:
+        return {"last_message_id": None, "last_message_sender_id": None,
+                "last_message_preview": None, "last_activity_at": None}
+    return {
+        "last_message_id": msg_row["id"],
+        "last_message_sender_id": msg_row["sender_id"],
+        "last_message_preview": build_last_message_snippet(msg_row["content"], msg_row["original_file_name"]),
+        "last_activity_at": msg_row["updated_at"] or msg_row["created_at"],
+    }
+
+
+async def create_inbox_rows(session: AsyncSession, chat_id: int, user1_id: int, user2_id: int):
+    await session.execute(insert(chat_inbox), [
+        {"user_id": user1_id, "chat_id": chat_id, "partner_id": user2_id, "unread_count": 0},
+        {"user_id": user2_id, "chat_id": chat_id, "partner_id": user1_id, "unread_count": 0},
+    ])
+
+
+async def record_new_message(session: AsyncSession, chat_id: int, msg_row, count: int = 1):
+    # Нове повідомлення завжди останнє; отримувачу +count до непрочитаних (пакет від одного відправника)
+    await session.execute(
+        update(chat_inbox)
+        .where(chat_inbox.c.chat_id == chat_id)
+        .values(
+            **_last_message_values(msg_row),
+            unread_count=chat_inbox.c.unread_count + case((chat_inbox.c.user_id != msg_row["sender_id"], count),
+                                                          else_=0),
+        )
+    )
+
+
+async def record_edited_message(session: AsyncSession, chat_id: int, msg_row):
+    # Редагування змінює прев'ю лише тоді, коли це останнє повідомлення чату
+    await session.execute(
+        update(chat_inbox)
+        .where((chat_inbox.c.chat_id == chat_id) & (chat_inbox.c.last_message_id == msg_row["id"]))
+        .values(**_last_message_values(msg_row))
+    )
+
+
+async def record_deleted_message(session: AsyncSession, chat_id: int, message_id: int):
+    """Викликати після DELETE повідомлення: перераховує непрочитані й, за потреби, останнє повідомлення."""
+    await refresh_unread_counts(session, chat_id)
+
+    was_last_result = await session.execute(
+        select(chat_inbox.c.user_id)
+        .where((chat_inbox.c.chat_id == chat_id) & (chat_inbox.c.last_message_id == message_id))
+        .limit(1)
+    )
+    if not was_last_result.first():
+        return
+    new_last_result = await session.execute(
+        select(message.c.id, message.c.sender_id, message.c.content, message.c.original_file_name,
+               message.c.created_at, message.c.updated_at)
+        .where(message.c.chat_id == chat_id)
+        .order_by(message.c.created_at.desc(), message.c.id.desc())
+        .limit(1)
+    )
+    await session.execute(
+        update(chat_inbox)
+        .where(chat_inbox.c.chat_id == chat_id)
+        .values(**_last_message_values(new_last_result.mappings().first()))
+    )
+
+
+async def refresh_unread_counts(session: AsyncSession, chat_id: int, user_id: Optional[int] = None):
+    """Точний перерахунок: повідомлення співрозмовника з id вище межі прочитаного (індекс chat_id, sender_id, id).
+
+    Окремий запит бачить повідомлення, закомічені конкурентно, тому лічильник не розходиться з межею.
+    """
+    last_read_id = case((chat.c.user1_id == chat_inbox.c.user_id, chat.c.user1_last_read_message_id),
+                        else_=chat.c.user2_last_read_message_id)
+    unread_count = (
+        select(func.count(message.c.id))
+        .where((chat.c.id == chat_inbox.c.chat_id) & (message.c.chat_id == chat_inbox.c.chat_id) & (
+                message.c.sender_id == chat_inbox.c.partner_id) & (message.c.id > last_read_id))
+        .scalar_subquery()
+    )
+    stmt = update(chat_inbox).where(chat_inbox.c.chat_id == chat_id).values(unread_count=unread_count)
+    if user_id is not None:
+        stmt = stmt.where(chat_inbox.c.user_id == user_id)
+    await session.execute(stmt)
+
+
+async def delete_inbox_rows(session: AsyncSession, chat_ids):
+    await session.execute(delete(chat_inbox).where(chat_inbox.c.chat_id.in_(chat_ids)))
@@ -1,17 +1,20 @@
+import asyncio
+import html
+import json
 import os
-import shutil
-import uuid
-from datetime import datetime, timedelta, timezone
+from datetime import datetime
 from typing import List, Any, Dict, Optional
 
 from fastapi import Path as FastApiPath  # Зберігаємо для get_chat_attachment
-from fastapi import APIRouter, Depends, HTTPException, Query, Form, UploadFile, File
-from pydantic import BaseModel  # Додано для тіла запиту редагування
+from fastapi import APIRouter, Depends, HTTPException, Query, Form, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi import Request, Response
+from fastapi import status
+from pydantic import BaseModel, Field  # Додано для тіла запиту редагування
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import insert, select, or_, update, func, desc, delete, and_  # Додано and_
-from starlette.responses import FileResponse
+from sqlalchemy import insert, select, or_, update, func, desc, delete, and_, case, tuple_, Sequence  # Додано and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from auth.database import get_async_session, User
+from auth.database import get_async_session, User, async_session_maker
 # Припускаємо, що у вас є об'єкти таблиць, визначені приблизно так:
 # from models.models import chat, message, user as user_table, task
 # Для прикладу, я буду використовувати ці імена.
@@ -19,11 +22,26 @@ from auth.database import get_async_session, User
 # Column("updated_at", TIMESTAMP, nullable=True),
 # Column("is_edited", Boolean, default=False, nullable=False),
 
-from models.models import chat, task, message  # <--- Переконайтесь, що message тут оновлено
+from models.models import chat, task, message, message_tombstone, message_client_id, chat_inbox  # <--- Переконайтесь, що message тут оновлено
 from models.models import user as user_table
 from fastapi_users import FastAPIUsers
-from auth.auth import auth_backend
-from auth.manager import get_user_manager
+from fastapi_users.db import SQLAlchemyUserDatabase
+from auth.auth import auth_backend, get_jwt_strategy
+from auth.manager import get_user_manager, UserManager
+from routes.connection_manager import manager
+from routes.presence import presence_tracker
+from routes.typing_state import typing_tracker
+from routes.user_loader import UserLoader, UserSummary, get_user_loader
+from routes.blob_store import (stage_upload, discard_staged, acquire_blob, place_blob, release_blobs, collect_garbage,
+                               storage_name, parse_storage_name, blob_path)
+from routes.file_storage import conditional_file_response
+from routes.http_cache import check_not_modified, make_etag
+from routes.message_archive import read_archived_messages
+from routes.thumbnails import thumbnail_generator, thumbnail_urls
+from routes.chat_deletion import delete_chats, finish_chat_deletion
+from routes.chat_inbox import (create_inbox_rows, record_new_message, record_edited_message, record_deleted_message,
+                               refresh_unread_counts)
+from config import MAX_CHAT_UPLOAD_SIZE, CHAT_LEGACY_UPLOAD_DIR
 
 router = APIRouter(
     prefix="/chats",
@@ -35,56 +53,147 @@ fastapi_users = FastAPIUsers[User, int](
     [auth_backend],
 )
 
-UPLOAD_DIR = "./uploaded_chat_files"
+UPLOAD_DIR = CHAT_LEGACY_UPLOAD_DIR  # Старі вкладення (до blob-сховища), лише для читання та видалення
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+SYNC_MAX_CHANGES = 500
+MAX_MESSAGE_BATCH_SIZE = 100
+# Менше за типовий тайм-аут простою проксі (30-60 с), щоб проксі не обірвав запит, що чекає
+LONG_POLL_TIMEOUT_SECONDS = 25
+LONG_POLL_MAX_TIMEOUT_SECONDS = 55
+
+SEARCH_CONFIG = "simple"  # Має збігатися з конфігурацією в messages.search_vector
+# Маркери з Private Use Area не трапляються у звичайному тексті й переживають html.escape
+SEARCH_HIGHLIGHT_START = "\ue000"
+SEARCH_HIGHLIGHT_STOP = "\ue001"
+SEARCH_HEADLINE_OPTIONS = (f"StartSel={SEARCH_HIGHLIGHT_START}, StopSel={SEARCH_HIGHLIGHT_STOP}, "
+                           "MaxWords=20, MinWords=8, MaxFragments=2, FragmentDelimiter=\" … \"")
+
 
 # --- Pydantic модель для тіла запиту редагування повідомлення ---
 class MessageUpdatePayload(BaseModel):
     text: str
 
 
+class OutboxMessagePayload(BaseModel):
+    client_id: str = Field(..., min_length=1, max_length=64)  # Генерує клієнт; ключ від дублікатів
+    chat_id: int
+    text: str
+
+
+class MessageBatchPayload(BaseModel):
+    messages: List[OutboxMessagePayload] = Field(..., min_length=1, max_length=MAX_MESSAGE_BATCH_SIZE)
+
+
 async def get_current_active_user_and_update_last_seen(
         current_user_dependency: User = Depends(fastapi_users.current_user(active=True)),
-        session: AsyncSession = Depends(get_async_session)
 ):
+    # Лише heartbeat у пам'яті; last_seen у БД пише presence_tracker пакетами раз на кілька секунд
     if current_user_dependency:
-        stmt = (
-            update(user_table)
-            .where(user_table.c.id == current_user_dependency.id)
-            .values(last_seen=datetime.utcnow())
-        )
-        await session.execute(stmt)
-        await session.commit()
+        presence_tracker.touch(current_user_dependency.id)
     return current_user_dependency
 
 
-async def get_partner_details(user_id: int, session: AsyncSession):
+async def get_user_from_websocket_token(token: Optional[str]) -> Optional[User]:
+    # Браузерний WebSocket не вміє передавати заголовок Authorization, тому JWT приходить у query-параметрі
+    async with async_session_maker() as session:
+        user_manager = UserManager(SQLAlchemyUserDatabase(session, User))
+        ws_user = await get_jwt_strategy().read_token(token, user_manager)
+    if not ws_user or not ws_user.is_active:
+        return None
+    return ws_user
+
+
+def format_message(msg_data, current_user_id: Optional[int], read_watermarks: Dict[int, int]) -> Dict[str, Any]:
+    created_at_iso = (msg_data["created_at"].isoformat() + "Z") if isinstance(msg_data["created_at"],
+                                                                              datetime) else str(
+        msg_data["created_at"])
+    updated_at_iso = (msg_data["updated_at"].isoformat() + "Z") if msg_data["updated_at"] and isinstance(
+        msg_data["updated_at"], datetime) else None
+
+    file_url = None
+    if msg_data["file_path"]:
+        file_url = f"http://localhost:8000/chats/attachments/{msg_data['file_path']}"
+
+    sender_type = None  # Для WebSocket-подій клієнт визначає "me"/"other" сам за sender_id
+    if current_user_id is not None:
+        sender_type = "me" if msg_data["sender_id"] == current_user_id else "other"
+
+    return {
+        "id": msg_data["id"],
+        "text": msg_data["content"],
+        "sender": sender_type,
+        "sender_id": msg_data["sender_id"],
+        "created_at": created_at_iso,
+        "updated_at": updated_at_iso,
+        "is_edited": msg_data["is_edited"],
+        # Прочитане, якщо отримувач уже дочитав чат до цього повідомлення (див. chat_read_watermarks)
+        "is_read": any(user_id != msg_data["sender_id"] and msg_data["id"] <= last_read_id
+                       for user_id, last_read_id in read_watermarks.items()),
+        "file_url": file_url,
+        "original_file_name": msg_data["original_file_name"],
+        "mime_type": msg_data["mime_type"],
+        # Зменшені копії для бульбашок; поки їх генерують, сервер редиректить на оригінал
+        "thumbnail_urls": thumbnail_urls(msg_data["file_path"], msg_data["mime_type"]),
+    }
+
+
+def chat_read_watermarks(chat_row) -> Dict[int, int]:
+    # user_id: id повідомлення, до якого включно учасник прочитав чат
+    return {
+        chat_row["user1_id"]: chat_row["user1_last_read_message_id"],
+        chat_row["user2_id"]: chat_row["user2_last_read_message_id"],
+    }
+
+
+def read_watermarks_for(read_watermarks: Dict[int, int], current_user_id: int) -> Dict[str, int]:
+    partner_last_read_ids = [last_read_id for user_id, last_read_id in read_watermarks.items()
+                             if user_id != current_user_id]
+    return {
+        "last_read_message_id": read_watermarks.get(current_user_id, 0),
+        "partner_last_read_message_id": partner_last_read_ids[0] if partner_last_read_ids else 0,
+    }
+
+
+async def next_chat_change_seq(chat_id: int, session: AsyncSession, count: int = 1) -> int:
+    # UPDATE тримає блокування рядка чату до коміту, тому в межах одного чату номери змін
+    # видаються в порядку комітів і /sync не може "перескочити" ще не закомічену зміну.
+    # Для пакета з count змін повертає останній номер; зайняті номери - (результат - count, результат]
     result = await session.execute(
-        select(user_table.c.username, user_table.c.last_seen).where(user_table.c.id == user_id)
+        update(chat)
+        .where(chat.c.id == chat_id)
+        .values(change_seq=chat.c.change_seq + count)
+        .returning(chat.c.change_seq)
     )
-    partner_db_details = result.mappings().first()
-    if not partner_db_details:
+    return result.scalar_one()
+
+
+def partner_last_seen(partners: Dict[int, Optional[UserSummary]], partner_id: int) -> Optional[datetime]:
+    partner_summary = partners.get(partner_id)
+    return partner_summary.last_seen if partner_summary else None
+
+
+async def get_partner_details(user_id: int, user_loader: UserLoader):
+    partner_summary = await user_loader.load(user_id)
+    if not partner_summary:
         return {"username": "Unknown", "last_seen": None, "is_online": False}
-    is_online = False
-    if partner_db_details["last_seen"]:
-        last_seen_dt = partner_db_details["last_seen"]
-        if isinstance(last_seen_dt, str):
-            try:
-                last_seen_dt = datetime.fromisoformat(last_seen_dt)
-            except ValueError:
-                try:
-                    last_seen_dt = datetime.strptime(last_seen_dt, "%Y-%m-%d %H:%M:%S.%f")
-                except ValueError:
-                    last_seen_dt = None
-        if last_seen_dt:
-            if last_seen_dt.tzinfo:
-                last_seen_dt = last_seen_dt.replace(tzinfo=None)  # Ensure naive for comparison
-            else:
-                last_seen_dt = last_seen_dt  # Already naive
-            current_utc_time = datetime.utcnow()  # Naive UTC
-            if current_utc_time - last_seen_dt < timedelta(minutes=5): is_online = True
-    return {"username": partner_db_details["username"], "is_online": is_online}
+    return {"username": partner_summary.username,
+            "is_online": presence_tracker.is_online(user_id, partner_summary.last_seen)}
+
+
+async def mark_user_typing(chat_id: int, user_id: int):
+    # typing_tracker оновиться в apply_chat_event_to_typing_state - так само, як і на інших воркерах
+    await manager.broadcast_to_chat({"type": "typing", "chat_id": chat_id, "user_id": user_id}, chat_id)
+
+
+async def apply_chat_event_to_typing_state(event: Dict[str, Any], chat_id: int):
+    if event.get("type") == "typing":
+        typing_tracker.mark_typing(chat_id, event["user_id"])
+    elif event.get("type") == "message_created":
+        typing_tracker.clear(chat_id, event["message"]["sender_id"])  # Надіслане повідомлення завершує "друкує..."
+
+
+manager.subscribe(apply_chat_event_to_typing_state)
 
 
 @router.post("/with-owner/{task_id}")
@@ -107,120 +216,256 @@ async def create_chat_with_owner(
     new_chat_stmt = insert(chat).values(user1_id=customer_id, user2_id=executor_id, task_id=task_id,
                                         created_at=datetime.utcnow()).returning(chat.c.id)
     new_chat_result = await session.execute(new_chat_stmt)
-    await session.commit()
     chat_id_val = new_chat_result.scalar_one()
+    await create_inbox_rows(session, chat_id_val, customer_id, executor_id)
+    await session.commit()
+    await manager.add_chat_members(chat_id_val, [customer_id, executor_id],
+                                   {"type": "chat_created", "chat_id": chat_id_val})
     return {"chat_id": chat_id_val}
 
 
 @router.get("/", response_model=List[Dict[str, Any]])
 async def get_user_chats(
+        request: Request,
+        response: Response,
         session: AsyncSession = Depends(get_async_session),
+        user_loader: UserLoader = Depends(get_user_loader),
         current_user: User = Depends(get_current_active_user_and_update_last_seen),
 ):
-    user_chats_query = select(
-        chat.c.id,
-        chat.c.user1_id,
-        chat.c.user2_id,
-        chat.c.user1_last_typing_at,
-        chat.c.user2_last_typing_at
-    ).where(or_(chat.c.user1_id == current_user.id, chat.c.user2_id == current_user.id))
-
-    user_chats_select_result = await session.execute(user_chats_query)
-    user_chats_list = user_chats_select_result.mappings().fetchall()
-
-    if not user_chats_list:
-        return []
-
-    chats_data = []
-    typing_threshold_time = datetime.utcnow() - timedelta(seconds=5)
-
-    for chat_item_map in user_chats_list:
-        partner_id = chat_item_map["user1_id"] if chat_item_map["user2_id"] == current_user.id else chat_item_map[
-            "user2_id"]
-        partner_details = await get_partner_details(partner_id, session)
-
-        partner_is_typing = False
-        partner_typing_at = None
-        if chat_item_map["user1_id"] == partner_id:
-            partner_typing_at = chat_item_map["user1_last_typing_at"]
-        elif chat_item_map["user2_id"] == partner_id:
-            partner_typing_at = chat_item_map["user2_last_typing_at"]
-
-        if partner_typing_at and isinstance(partner_typing_at, datetime) and partner_typing_at > typing_threshold_time:
-            partner_is_typing = True
-
-        last_message_select = await session.execute(
-            select(message.c.content, message.c.created_at, message.c.sender_id, message.c.is_read,
-                   message.c.original_file_name, message.c.updated_at,
-                   message.c.is_edited)  # Додано updated_at, is_edited
-            .where(message.c.chat_id == chat_item_map["id"])
-            .order_by(message.c.created_at.desc()).limit(1)
+    # Версія списку: change_seq росте на кожен запис у чат (повідомлення, редагування, прочитання),
+    # склад чатів видно з їх id; "онлайн" і "друкує..." залежать від часу, тому входять окремо
+    version_result = await session.execute(
+        select(chat_inbox.c.chat_id, chat.c.change_seq, chat_inbox.c.partner_id)
+        .select_from(chat_inbox.join(chat, chat.c.id == chat_inbox.c.chat_id))
+        .where(chat_inbox.c.user_id == current_user.id)
+        .order_by(chat_inbox.c.chat_id)
+    )
+    version_rows = version_result.all()
+    # Усі співрозмовники - одним запитом, а здебільшого з кешу без запиту взагалі
+    partners = await user_loader.load_many(row.partner_id for row in version_rows)
+    etag = make_etag("chats", current_user.id, [
+        (row.chat_id, row.change_seq,
+         presence_tracker.is_online(row.partner_id, partner_last_seen(partners, row.partner_id)),
+         typing_tracker.is_typing(row.chat_id, row.partner_id))
+        for row in version_rows
+    ])
+    not_modified = check_not_modified(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    # Список чатів - один прохід індексом (user_id, last_activity_at) по chat_inbox, яку підтримують
+    # ендпоінти запису; таблиця messages тут не читається, тож час відповіді не залежить від історії
+    partner_last_read_expr = case((chat.c.user1_id == current_user.id, chat.c.user2_last_read_message_id),
+                                  else_=chat.c.user1_last_read_message_id)
+
+    inbox_query = (
+        select(
+            chat_inbox.c.chat_id.label("id"),
+            chat_inbox.c.partner_id,
+            chat_inbox.c.last_message_id,
+            chat_inbox.c.last_message_sender_id,
+            chat_inbox.c.last_message_preview,
+            chat_inbox.c.last_activity_at,
+            chat_inbox.c.unread_count,
+            partner_last_read_expr.label("partner_last_read_message_id"),
         )
-        last_msg_obj = last_message_select.mappings().first()
+        .select_from(chat_inbox.join(chat, chat.c.id == chat_inbox.c.chat_id))
+        .where(chat_inbox.c.user_id == current_user.id)
+        .order_by(chat_inbox.c.last_activity_at.desc().nulls_last(), chat_inbox.c.chat_id.desc())
+    )
+    inbox_result = await session.execute(inbox_query)
+    inbox_rows = inbox_result.mappings().fetchall()
 
+    chats_data = []
+    for row in inbox_rows:
         last_message_snippet = None
         last_message_timestamp = None
         last_message_sent_by_me = None
         is_last_message_read_by_partner = None
 
-        if last_msg_obj:
-            content = last_msg_obj["content"]
-            file_name_snippet = last_msg_obj["original_file_name"]
-
-            if content:
-                last_message_snippet = content[:40] + "..." if len(content) > 40 else content
-            elif file_name_snippet:
-                last_message_snippet = f"Файл: {file_name_snippet[:30]}"
-                if len(file_name_snippet) > 30: last_message_snippet += "..."
-            else:
-                last_message_snippet = "Повідомлення без тексту"
-
-            # Використовуємо updated_at якщо є, інакше created_at
-            timestamp_to_use = last_msg_obj["updated_at"] if last_msg_obj["updated_at"] else last_msg_obj["created_at"]
-            if isinstance(timestamp_to_use, datetime):
-                last_message_timestamp = timestamp_to_use.isoformat() + "Z"
-            else:
-                try:
-                    last_message_timestamp = datetime.fromisoformat(
-                        str(timestamp_to_use).replace("Z", "+00:00")).isoformat() + "Z"
-                except:
-                    last_message_timestamp = str(timestamp_to_use)
-
-            last_message_sent_by_me = (last_msg_obj["sender_id"] == current_user.id)
+        if row["last_message_id"] is not None:
+            last_message_snippet = row["last_message_preview"]
+            last_message_timestamp = row["last_activity_at"].isoformat() + "Z"
+            last_message_sent_by_me = (row["last_message_sender_id"] == current_user.id)
             if last_message_sent_by_me:
-                is_last_message_read_by_partner = last_msg_obj["is_read"]
-
-        unread_count_select = await session.execute(
-            select(func.count(message.c.id))
-            .where((message.c.chat_id == chat_item_map["id"]) & (message.c.sender_id == partner_id) & (
-                    message.c.is_read == False))
-        )
-        unread_messages_count = unread_count_select.scalar_one_or_none() or 0
+                is_last_message_read_by_partner = row["last_message_id"] <= row["partner_last_read_message_id"]
 
+        partner_summary = partners.get(row["partner_id"])
         chats_data.append({
-            "id": chat_item_map["id"],
-            "partner_name": partner_details["username"],
-            "partner_is_online": partner_details["is_online"],
-            "partner_is_typing": partner_is_typing,
+            "id": row["id"],
+            "partner_name": partner_summary.username if partner_summary else "Unknown",
+            "partner_is_online": presence_tracker.is_online(row["partner_id"],
+                                                            partner_last_seen(partners, row["partner_id"])),
+            "partner_is_typing": typing_tracker.is_typing(row["id"], row["partner_id"]),
             "last_message_snippet": last_message_snippet,
             "last_message_timestamp": last_message_timestamp,
             "last_message_sent_by_me": last_message_sent_by_me,
             "is_last_message_read_by_partner": is_last_message_read_by_partner,
-            "unread_messages_count": unread_messages_count,
+            "unread_messages_count": row["unread_count"] or 0,
         })
 
-    chats_data.sort(
-        key=lambda x: datetime.fromisoformat(x["last_message_timestamp"].replace("Z", "+00:00")) if x[
-            "last_message_timestamp"] else datetime.min.replace(tzinfo=timezone.utc),
-        reverse=True
-    )
     return chats_data
 
 
+def highlight_to_html(headline: Optional[str]) -> Optional[str]:
+    # Спершу екрануємо текст повідомлення, і лише потім маркери ts_headline стають <mark>,
+    # тож клієнт може безпечно вставляти highlight як HTML
+    if headline is None:
+        return None
+    return html.escape(headline).replace(SEARCH_HIGHLIGHT_START, "<mark>").replace(SEARCH_HIGHLIGHT_STOP, "</mark>")
+
+
+def parse_search_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        rank, message_id = cursor.split(":")
+        return float(rank), int(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некоректний курсор пошуку")
+
+
+async def search_messages(session: AsyncSession, current_user_id: int, q: str, limit: int,
+                          cursor: Optional[str], chat_id: Optional[int] = None) -> Dict[str, Any]:
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="Порожній пошуковий запит")
+
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank_cd(message.c.search_vector, ts_query)
+    partner = user_table.alias("partner")
+    search_query = (
+        select(
+            message.c.id, message.c.chat_id, message.c.sender_id, message.c.created_at,
+            rank.label("rank"),
+            func.ts_headline(SEARCH_CONFIG, func.coalesce(message.c.content, message.c.original_file_name, ""),
+                             ts_query, SEARCH_HEADLINE_OPTIONS).label("headline"),
+            partner.c.username.label("partner_username"),
+        )
+        # JOIN з chat_inbox за (user_id, chat_id) обмежує пошук чатами, де користувач є учасником
+        .select_from(
+            message.join(chat_inbox, (chat_inbox.c.chat_id == message.c.chat_id) & (
+                    chat_inbox.c.user_id == current_user_id))
+            .outerjoin(partner, partner.c.id == chat_inbox.c.partner_id)
+        )
+        .where(message.c.search_vector.bool_op("@@")(ts_query))  # GIN-індекс ix_messages_search_vector
+    )
+    if chat_id is not None:
+        search_query = search_query.where(message.c.chat_id == chat_id)
+    parsed_cursor = parse_search_cursor(cursor)
+    if parsed_cursor:
+        search_query = search_query.where(tuple_(rank, message.c.id) < tuple_(*parsed_cursor))
+    search_query = search_query.order_by(rank.desc(), message.c.id.desc()).limit(limit)
+
+    search_result = await session.execute(search_query)
+    rows = search_result.mappings().fetchall()
+
+    # Курсор - (rank, id) останнього результату; repr(float) відтворює rank без втрат
+    next_cursor = f"{rows[-1]['rank']!r}:{rows[-1]['id']}" if len(rows) == limit else None
+    return {
+        "results": [{
+            "message_id": row["id"],
+            "chat_id": row["chat_id"],
+            "partner_name": row["partner_username"] or "Unknown",
+            "sender": "me" if row["sender_id"] == current_user_id else "other",
+            "created_at": row["created_at"].isoformat() + "Z" if row["created_at"] else None,
+            "highlight": highlight_to_html(row["headline"]),
+        } for row in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+# Оголошено до /{chat_id}, інакше "search" потрапив би в параметр chat_id
+@router.get("/search", response_model=Dict[str, Any])
+async def search_all_chats(
+        q: str = Query(..., min_length=1, max_length=200),
+        limit: int = Query(20, ge=1, le=50),
+        cursor: Optional[str] = Query(None),  # next_cursor з попередньої сторінки
+        session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_active_user_and_update_last_seen),
+):
+    return await search_messages(session, current_user.id, q, limit, cursor)
+
+
+@router.get("/{chat_id}/search", response_model=Dict[str, Any])
+async def search_chat(
+        chat_id: int,
+        q: str = Query(..., min_length=1, max_length=200),
+        limit: int = Query(20, ge=1, le=50),
+        cursor: Optional[str] = Query(None),
+        session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_active_user_and_update_last_seen),
+):
+    result = await session.execute(select(chat.c.user1_id, chat.c.user2_id).where(chat.c.id == chat_id))
+    chat_row = result.mappings().first()
+    if not chat_row or current_user.id not in [chat_row["user1_id"], chat_row["user2_id"]]:
+        raise HTTPException(status_code=403, detail="Немає доступу до чату")
+    return await search_messages(session, current_user.id, q, limit, cursor, chat_id)
+
+
+async def get_updates_cursor(session: AsyncSession, user_id: int) -> str:
+    # Змінюється разом зі списком чатів, change_seq будь-якого з них або межами прочитання
+    result = await session.execute(
+        select(chat.c.id, chat.c.change_seq, chat.c.user1_last_read_message_id, chat.c.user2_last_read_message_id)
+        .select_from(chat_inbox.join(chat, chat.c.id == chat_inbox.c.chat_id))
+        .where(chat_inbox.c.user_id == user_id)
+        .order_by(chat.c.id)
+    )
+    return make_etag("updates", user_id, [tuple(row) for row in result])
+
+
+# Оголошено до /{chat_id}, інакше "updates" потрапив би в параметр chat_id
+@router.get("/updates", response_model=Dict[str, Any])
+async def long_poll_chat_updates(
+        cursor: Optional[str] = Query(None),  # cursor з попередньої відповіді; без нього - лише рукостискання
+        timeout: int = Query(LONG_POLL_TIMEOUT_SECONDS, ge=0, le=LONG_POLL_MAX_TIMEOUT_SECONDS),
+        session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_active_user_and_update_last_seen),
+):
+    """Запасний канал для клієнтів без WebSocket: запит висить, доки в чатах користувача щось не зміниться.
+
+    changed=true означає, що клієнт має дотягнути зміни через /chats/ і /{chat_id}/sync;
+    events містить лише події, яких немає в БД ("друкує..." співрозмовника). user_id і chat_ids
+    повертаються лише на рукостискання (без cursor).
+    """
+    user_id = current_user.id
+    result = await session.execute(select(chat_inbox.c.chat_id).where(chat_inbox.c.user_id == user_id))
+    chat_ids = result.scalars().all()
+    # Реєструємось до читання стану: подія про зміну, закомічену після нього, гарантовано нас розбудить
+    waiter = manager.add_waiter(user_id, chat_ids)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        while True:
+            # Події забираємо до запиту стану, тож усе, що вони повідомили, стан уже бачить
+            # Власне "друкує..." клієнту не потрібне і не повинне завершувати очікування
+            typing_events = [event for event in waiter.take_events()
+                             if event.get("type") == "typing" and event.get("user_id") != user_id]
+            new_cursor = await get_updates_cursor(session, user_id)
+            await session.commit()  # Не тримаємо з'єднання з пулу, поки запит чекає
+            changed = cursor is not None and new_cursor != cursor
+            if cursor is None or changed or typing_events:
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0 or not await waiter.wait(remaining):
+                break
+    finally:
+        manager.remove_waiter(waiter)
+    # Запит міг чекати довше за інтервал heartbeat-у - оновлюємо "онлайн" і на виході
+    presence_tracker.touch(user_id)
+
+    response = {"cursor": new_cursor, "changed": changed, "events": typing_events}
+    if cursor is None:
+        # Дані рукостискання потрібні клієнту лише один раз, як у події "connected" сокета
+        response.update(user_id=user_id, chat_ids=list(chat_ids))
+    return response
+
+
 @router.get("/{chat_id}")
 async def get_chat_by_id(
         chat_id: int,
         session: AsyncSession = Depends(get_async_session),
+        user_loader: UserLoader = Depends(get_user_loader),
         current_user: User = Depends(get_current_active_user_and_update_last_seen),
 ):
     result = await session.execute(
@@ -228,8 +473,6 @@ async def get_chat_by_id(
             chat.c.id,
             chat.c.user1_id,
             chat.c.user2_id,
-            chat.c.user1_last_typing_at,
-            chat.c.user2_last_typing_at
         ).where(chat.c.id == chat_id)
     )
     chat_row = result.mappings().first()
@@ -238,25 +481,13 @@ async def get_chat_by_id(
         raise HTTPException(status_code=403, detail="Access denied")
 
     partner_id = chat_row["user1_id"] if chat_row["user2_id"] == current_user.id else chat_row["user2_id"]
-    partner_details = await get_partner_details(partner_id, session)
-
-    partner_is_typing = False
-    typing_threshold_time = datetime.utcnow() - timedelta(seconds=5)
-    partner_typing_at = None
-
-    if chat_row["user1_id"] == partner_id:
-        partner_typing_at = chat_row["user1_last_typing_at"]
-    elif chat_row["user2_id"] == partner_id:
-        partner_typing_at = chat_row["user2_last_typing_at"]
-
-    if partner_typing_at and isinstance(partner_typing_at, datetime) and partner_typing_at > typing_threshold_time:
-        partner_is_typing = True
+    partner_details = await get_partner_details(partner_id, user_loader)
 
     return {
         "id": chat_row["id"],
         "partner_name": partner_details["username"],
         "partner_is_online": partner_details["is_online"],
-        "partner_is_typing": partner_is_typing
+        "partner_is_typing": typing_tracker.is_typing(chat_id, partner_id)
     }
 
 
@@ -279,147 +510,365 @@ async def send_message_endpoint(
     file_path_in_db = None
     original_filename_for_db = None
     mime_type_for_db = None
+    staged_file = None
 
     if file:
         original_filename_for_db = file.filename
         mime_type_for_db = file.content_type
-        file_extension = os.path.splitext(original_filename_for_db)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        server_file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        file_path_in_db = unique_filename
-
         try:
-            with open(server_file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            staged_file = await stage_upload(file, MAX_CHAT_UPLOAD_SIZE)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Не вдалося зберегти файл: {str(e)}")
         finally:
             await file.close()
+        file_path_in_db = storage_name(staged_file.sha256, original_filename_for_db)
 
     current_time_utc = datetime.utcnow()
-    new_msg_stmt = insert(message).values(
-        chat_id=chat_id,
-        sender_id=current_user.id,
-        content=text.strip() if text else None,
-        created_at=current_time_utc,  # Використовуємо змінну
-        updated_at=None,  # Нові повідомлення не мають updated_at спочатку
-        is_edited=False,  # Нові повідомлення не відредаговані
-        is_read=False,
-        file_path=file_path_in_db,
-        original_file_name=original_filename_for_db,
-        mime_type=mime_type_for_db
-    ).returning(
-        message.c.id, message.c.content, message.c.sender_id,
-        message.c.created_at, message.c.updated_at, message.c.is_edited, message.c.is_read,
-        # Додано updated_at, is_edited
-        message.c.file_path, message.c.original_file_name, message.c.mime_type
-    )
-    new_msg_result = await session.execute(new_msg_stmt)
-    await session.commit()
-    msg_db_data = new_msg_result.mappings().first()
+    try:
+        # Порядок блокувань (рядок чату, потім blob) такий самий, як при видаленні повідомлення
+        change_seq = await next_chat_change_seq(chat_id, session)
+        if staged_file:
+            # Однаковий вміст зберігається один раз - лише збільшуємо лічильник посилань
+            await acquire_blob(session, staged_file, mime_type_for_db)
+        new_msg_stmt = insert(message).values(
+            chat_id=chat_id,
+            sender_id=current_user.id,
+            content=text.strip() if text else None,
+            created_at=current_time_utc,  # Використовуємо змінну
+            updated_at=None,  # Нові повідомлення не мають updated_at спочатку
+            is_edited=False,  # Нові повідомлення не відредаговані
+            file_path=file_path_in_db,
+            original_file_name=original_filename_for_db,
+            mime_type=mime_type_for_db,
+            change_seq=change_seq
+        ).returning(
+            message.c.id, message.c.content, message.c.sender_id,
+            message.c.created_at, message.c.updated_at, message.c.is_edited,
+            # Додано updated_at, is_edited
+            message.c.file_path, message.c.original_file_name, message.c.mime_type
+        )
+        new_msg_result = await session.execute(new_msg_stmt)
+        msg_db_data = new_msg_result.mappings().first()
+        if not msg_db_data:
+            raise HTTPException(status_code=500, detail="Не вдалося створити повідомлення")
+        await record_new_message(session, chat_id, msg_db_data)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        await discard_staged(staged_file)
+        raise
 
-    if not msg_db_data:
-        raise HTTPException(status_code=500, detail="Не вдалося створити повідомлення")
+    if staged_file:
+        await place_blob(staged_file)
+        thumbnail_generator.schedule(staged_file.sha256, mime_type_for_db)
 
-    created_at_iso = (msg_db_data["created_at"].isoformat() + "Z") if isinstance(msg_db_data["created_at"],
-                                                                                 datetime) else str(
-        msg_db_data["created_at"])
-    updated_at_iso = (msg_db_data["updated_at"].isoformat() + "Z") if msg_db_data["updated_at"] and isinstance(
-        msg_db_data["updated_at"], datetime) else None
+    read_watermarks = chat_read_watermarks(chat_row)
+    await manager.broadcast_to_chat(
+        {"type": "message_created", "chat_id": chat_id, "message": format_message(msg_db_data, None, read_watermarks)},
+        chat_id)
 
-    file_url = None
-    if msg_db_data["file_path"]:
-        file_url = f"http://localhost:8000/chats/attachments/{msg_db_data['file_path']}"
+    return format_message(msg_db_data, current_user.id, read_watermarks)
 
-    return {
-        "id": msg_db_data["id"],
-        "text": msg_db_data["content"],
-        "sender": "me",  # Завжди "me" для відправника
-        "created_at": created_at_iso,
-        "updated_at": updated_at_iso,  # Додано
-        "is_edited": msg_db_data["is_edited"],  # Додано
-        "is_read": msg_db_data["is_read"],
-        "file_url": file_url,
-        "original_file_name": msg_db_data["original_file_name"],
-        "mime_type": msg_db_data["mime_type"]
-    }
 
+@router.post("/messages/batch", response_model=Dict[str, Any])
+async def send_message_batch_endpoint(
+        payload: MessageBatchPayload,
+        session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_active_user_and_update_last_seen),
+):
+    """Офлайн-черга клієнта: текстові повідомлення в один чи кілька чатів одним запитом і однією транзакцією.
+
+    Повторна відправка з тими самими client_id безпечна - такі повідомлення повертаються зі статусом
+    "duplicate" і не створюються вдруге. Результати йдуть у порядку пакета, по одному на кожен елемент;
+    повтор client_id у тому ж пакеті отримує "rejected", а повідомлення створює лише перше входження.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    pending = []  # (client_id, chat_id, text) у порядку пакета
+    seen_client_ids = set()
+    for item in payload.messages:
+        if item.client_id in seen_client_ids:
+            continue  # Той самий client_id двічі в одному пакеті - відповідь для повтору нижче
+        seen_client_ids.add(item.client_id)
+        message_text = item.text.strip()
+        if not message_text:
+            results[item.client_id] = {"client_id": item.client_id, "status": "rejected",
+                                       "detail": "Повідомлення повинно містити текст."}
+            continue
+        pending.append((item.client_id, item.chat_id, message_text))
+
+    # Один запит на перевірку доступу до всіх чатів пакета
+    chat_rows = {}
+    if pending:
+        chats_result = await session.execute(select(chat).where(chat.c.id.in_({chat_id for _, chat_id, _ in pending})))
+        chat_rows = {row["id"]: row for row in chats_result.mappings()
+                     if current_user.id in (row["user1_id"], row["user2_id"])}
+    for client_id, chat_id, _ in pending:
+        if chat_id not in chat_rows:
+            results[client_id] = {"client_id": client_id, "status": "rejected", "detail": "Немає доступу до чату"}
+    pending = [item for item in pending if item[1] in chat_rows]
+
+    created_rows = []
+    if pending:
+        # id беремо з послідовності заздалегідь, щоб записати їх разом з client_id ще до вставки повідомлень
+        ids_result = await session.execute(
+            select(Sequence("messages_id_seq").next_value()).select_from(func.generate_series(1, len(pending))))
+        message_ids = sorted(ids_result.scalars().all())
+        current_time_utc = datetime.utcnow()
+
+        # Хто перший вставив client_id, той і створює повідомлення; конкурентний повтор пакета чекає на
+        # наш commit і отримує конфлікт
+        claim_result = await session.execute(
+            pg_insert(message_client_id)
+            .values([{"sender_id": current_user.id, "client_message_id": client_id, "chat_id": chat_id,
+                      "message_id": message_id, "created_at": current_time_utc}
+                     for message_id, (client_id, chat_id, _) in zip(message_ids, pending)])
+            .on_conflict_do_nothing()
+            .returning(message_client_id.c.client_message_id)
+        )
+        claimed = set(claim_result.scalars().all())
+
+        duplicate_client_ids = [client_id for client_id, _, _ in pending if client_id not in claimed]
+        if duplicate_client_ids:
+            existing_result = await session.execute(
+                select(message_client_id.c.client_message_id, message_client_id.c.message_id)
+                .where((message_client_id.c.sender_id == current_user.id) &
+                       message_client_id.c.client_message_id.in_(duplicate_client_ids))
+            )
+            for client_id, message_id in existing_result:
+                results[client_id] = {"client_id": client_id, "status": "duplicate", "message_id": message_id}
+
+        new_messages: Dict[int, List[Dict[str, Any]]] = {}  # chat_id: рядки в порядку пакета
+        for message_id, (client_id, chat_id, message_text) in zip(message_ids, pending):
+            if client_id in claimed:
+                new_messages.setdefault(chat_id, []).append({
+                    "client_id": client_id, "id": message_id, "chat_id": chat_id, "sender_id": current_user.id,
+                    "content": message_text, "created_at": current_time_utc, "updated_at": None,
+                    "is_edited": False, "file_path": None, "original_file_name": None, "mime_type": None,
+                })
+
+        # Чати блокуємо в порядку id, щоб два пакети з тими самими чатами не взаємоблокувались
+        for chat_id in sorted(new_messages):
+            chat_messages = new_messages[chat_id]
+            last_change_seq = await next_chat_change_seq(chat_id, session, count=len(chat_messages))
+            for offset, row in enumerate(chat_messages):
+                row["change_seq"] = last_change_seq - len(chat_messages) + 1 + offset
+            created_rows.extend(chat_messages)
+
+        if created_rows:
+            # Усі повідомлення пакета - один багаторядковий INSERT
+            message_columns = [column.name for column in message.c if column.name != "search_vector"]
+            await session.execute(insert(message).values(
+                [{name: row[name] for name in message_columns} for row in created_rows]))
+            for chat_id, chat_messages in new_messages.items():
+                await record_new_message(session, chat_id, chat_messages[-1], count=len(chat_messages))
+        await session.commit()
 
-@router.get("/{chat_id}/messages", response_model=List[Dict[str, Any]])
+    for row in created_rows:
+        read_watermarks = chat_read_watermarks(chat_rows[row["chat_id"]])
+        results[row["client_id"]] = {"client_id": row["client_id"], "status": "created",
+                                     "message": format_message(row, current_user.id, read_watermarks)}
+        await manager.broadcast_to_chat(
+            {"type": "message_created", "chat_id": row["chat_id"],
+             "message": format_message(row, None, read_watermarks)}, row["chat_id"])
+
+    response_results = []
+    answered_client_ids = set()
+    for item in payload.messages:
+        if item.client_id in answered_client_ids:
+            response_results.append({"client_id": item.client_id, "status": "rejected",
+                                     "detail": "client_id повторюється в пакеті"})
+        elif item.client_id in results:
+            answered_client_ids.add(item.client_id)
+            response_results.append(results[item.client_id])
+    return {"results": response_results}
+
+
+@router.get("/{chat_id}/messages", response_model=Dict[str, Any])
 async def get_messages_endpoint(
         chat_id: int,
-        page: int = Query(1, ge=1),
+        request: Request,
+        response: Response,
+        page: int = Query(1, ge=1),  # Лише для старих клієнтів; нові гортають історію курсорами
         page_size: int = Query(20, ge=1, le=100),
         sort_order: str = Query("asc", pattern="^(asc|desc)$"),  # Додано параметр сортування
+        before_id: Optional[int] = Query(None, ge=1),  # Повідомлення, старші за вказане
+        after_id: Optional[int] = Query(None, ge=1),  # Повідомлення, новіші за вказане
         session: AsyncSession = Depends(get_async_session),
         current_user: User = Depends(get_current_active_user_and_update_last_seen),
 ):
+    if before_id and after_id:
+        raise HTTPException(status_code=400, detail="Можна передати лише один з курсорів: before_id або after_id")
+
     result = await session.execute(select(chat).where(chat.c.id == chat_id))
     chat_row = result.mappings().first()
     if not chat_row or current_user.id not in [chat_row["user1_id"], chat_row["user2_id"]]:
         raise HTTPException(status_code=403, detail="Немає доступу до чату")
 
-    offset = (page - 1) * page_size
-
-    order_by_clause = message.c.created_at.asc() if sort_order == "asc" else message.c.created_at.desc()
+    # Будь-яка зміна в чаті збільшує change_seq, тож повтор того самого запиту без змін не читає messages
+    etag = make_etag("messages", chat_id, chat_row["change_seq"], current_user.id, str(request.query_params))
+    not_modified = check_not_modified(request, response, etag)
+    if not_modified is not None:
+        return not_modified
 
     messages_query = (
         select(
             message.c.id, message.c.content, message.c.sender_id,
-            message.c.created_at, message.c.updated_at, message.c.is_edited, message.c.is_read,
+            message.c.created_at, message.c.updated_at, message.c.is_edited,
             # Додано updated_at, is_edited
             message.c.file_path, message.c.original_file_name, message.c.mime_type
         )
         .where(message.c.chat_id == chat_id)
-        .order_by(order_by_clause)  # Використовуємо динамічне сортування
-        .offset(offset).limit(page_size)
     )
-    db_messages_result = await session.execute(messages_query)
-    db_messages_rows = db_messages_result.fetchall()  # fetchall() повертає список Row, а не Mappings
-    # якщо потрібні mappings, використовуйте .mappings().fetchall()
-
-    if not db_messages_rows: return []
-
-    messages_response_data = []
-    for msg_row_data in db_messages_rows:  # msg_row_data тут є RowProxy
-        sender_type = "me" if msg_row_data.sender_id == current_user.id else "other"
-
-        created_at_iso = (msg_row_data.created_at.isoformat() + "Z") if isinstance(msg_row_data.created_at,
-                                                                                   datetime) else str(
-            msg_row_data.created_at)
-        updated_at_iso = (msg_row_data.updated_at.isoformat() + "Z") if msg_row_data.updated_at and isinstance(
-            msg_row_data.updated_at, datetime) else None
-
-        file_url = None
-        if msg_row_data.file_path:
-            file_url = f"http://localhost:8000/chats/attachments/{msg_row_data.file_path}"
-
-        messages_response_data.append({
-            "id": msg_row_data.id,
-            "text": msg_row_data.content,
-            "sender": sender_type,
-            "created_at": created_at_iso,
-            "updated_at": updated_at_iso,  # Додано
-            "is_edited": msg_row_data.is_edited,  # Додано
-            "is_read": msg_row_data.is_read,
-            "file_url": file_url,
-            "original_file_name": msg_row_data.original_file_name,
-            "mime_type": msg_row_data.mime_type
-        })
-    return messages_response_data
+
+    anchor_id = before_id or after_id
+    if anchor_id:
+        # Keyset-пагінація: шукаємо за індексом (chat_id, created_at, id) одразу від курсора,
+        # тому глибока історія коштує стільки ж, скільки перша сторінка
+        walk_backwards = before_id is not None
+        anchor_result = await session.execute(
+            select(message.c.created_at, message.c.id)
+            .where((message.c.id == anchor_id) & (message.c.chat_id == chat_id))
+        )
+        anchor_row = anchor_result.first()
+        seek_key = tuple_(message.c.created_at, message.c.id)
+        if anchor_row:
+            anchor_key = tuple_(anchor_row.created_at, anchor_row.id)
+            # Окрема умова на created_at дає планувальнику відкинути місячні розділи по той бік курсора
+            if walk_backwards:
+                seek_condition = (seek_key < anchor_key) & (message.c.created_at <= anchor_row.created_at)
+            else:
+                seek_condition = (seek_key > anchor_key) & (message.c.created_at >= anchor_row.created_at)
+        else:
+            # Повідомлення-курсор могли видалити; id зростає разом з created_at, тож порівнюємо за id
+            seek_condition = message.c.id < anchor_id if walk_backwards else message.c.id > anchor_id
+        messages_query = messages_query.where(seek_condition)
+    else:
+        walk_backwards = sort_order == "desc"
+        messages_query = messages_query.offset((page - 1) * page_size)
+
+    if walk_backwards:
+        messages_query = messages_query.order_by(message.c.created_at.desc(), message.c.id.desc())
+    else:
+        messages_query = messages_query.order_by(message.c.created_at.asc(), message.c.id.asc())
+
+    db_messages_result = await session.execute(messages_query.limit(page_size))
+    db_messages_rows = list(db_messages_result.mappings().fetchall())
+
+    # Старі місяці перенесено в message_archive; курсорна історія продовжується з архіву без шва.
+    # Застарілі запити зі зміщенням page > 1 читають лише живі розділи
+    if anchor_id or page == 1:
+        if walk_backwards:
+            if len(db_messages_rows) < page_size:
+                db_messages_rows += await read_archived_messages(
+                    session, chat_id, page_size - len(db_messages_rows),
+                    before_id=db_messages_rows[-1]["id"] if db_messages_rows else before_id)
+        else:
+            # Вперед від курсора: архівні повідомлення старші за живі, тож ідуть першими
+            archived_rows = await read_archived_messages(session, chat_id, page_size, after_id=after_id,
+                                                         newest_first=False)
+            db_messages_rows = (archived_rows + db_messages_rows)[:page_size]
+
+    # next_cursor - id останнього рядка в напрямку обходу: його передають як before_id (назад) або after_id (вперед)
+    next_cursor = db_messages_rows[-1]["id"] if len(db_messages_rows) == page_size else None
+    if walk_backwards != (sort_order == "desc"):
+        db_messages_rows = list(reversed(db_messages_rows))
+
+    read_watermarks = chat_read_watermarks(chat_row)
+    return {
+        "messages": [format_message(msg_row_data, current_user.id, read_watermarks)
+                     for msg_row_data in db_messages_rows],
+        "next_cursor": next_cursor,
+        "sync_token": chat_row["change_seq"],  # Від нього клієнт далі запитує лише зміни через /sync
+        **read_watermarks_for(read_watermarks, current_user.id),
+    }
+
+
+@router.get("/{chat_id}/sync")
+async def sync_chat_changes_endpoint(
+        chat_id: int,
+        since: int = Query(..., ge=0),  # sync_token з попередньої відповіді /messages або /sync
+        session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_active_user_and_update_last_seen),
+):
+    result = await session.execute(
+        select(chat.c.user1_id, chat.c.user2_id, chat.c.change_seq, chat.c.tombstones_purged_seq,
+               chat.c.user1_last_read_message_id, chat.c.user2_last_read_message_id)
+        .where(chat.c.id == chat_id)
+    )
+    chat_row = result.mappings().first()
+    if not chat_row or current_user.id not in [chat_row["user1_id"], chat_row["user2_id"]]:
+        raise HTTPException(status_code=403, detail="Немає доступу до чату")
+
+    sync_token = chat_row["change_seq"]
+    read_watermarks = chat_read_watermarks(chat_row)
+    if since >= sync_token:
+        # Чат не змінювався - жодного сканування повідомлень
+        return {"messages": [], "deleted_message_ids": [], "sync_token": sync_token, "has_more": False,
+                **read_watermarks_for(read_watermarks, current_user.id)}
+    if since < chat_row["tombstones_purged_seq"]:
+        # Частину видалень після since уже прибрало обслуговування - інкрементально їх не віддати,
+        # тож клієнт має перезавантажити чат через /messages
+        return {"messages": [], "deleted_message_ids": [], "sync_token": sync_token, "has_more": False,
+                "resync_required": True, **read_watermarks_for(read_watermarks, current_user.id)}
+
+    changed_result = await session.execute(
+        select(
+            message.c.id, message.c.content, message.c.sender_id,
+            message.c.created_at, message.c.updated_at, message.c.is_edited,
+            message.c.file_path, message.c.original_file_name, message.c.mime_type, message.c.change_seq
+        )
+        .where((message.c.chat_id == chat_id) & (message.c.change_seq > since) & (message.c.change_seq <= sync_token))
+        .order_by(message.c.change_seq.asc())
+        .limit(SYNC_MAX_CHANGES)
+    )
+    changed_rows = changed_result.mappings().fetchall()
+
+    tombstones_result = await session.execute(
+        select(message_tombstone.c.message_id, message_tombstone.c.change_seq)
+        .where((message_tombstone.c.chat_id == chat_id) & (message_tombstone.c.change_seq > since) & (
+                message_tombstone.c.change_seq <= sync_token))
+        .order_by(message_tombstone.c.change_seq.asc())
+        .limit(SYNC_MAX_CHANGES)
+    )
+    tombstone_rows = tombstones_result.mappings().fetchall()
+
+    # Якщо змін більше за ліміт, віддаємо лише суцільний префікс і просимо клієнта дозапитати решту
+    has_more = False
+    for rows in (changed_rows, tombstone_rows):
+        if len(rows) == SYNC_MAX_CHANGES:
+            has_more = True
+            sync_token = min(sync_token, rows[-1]["change_seq"])
+
+    return {
+        "messages": [format_message(row, current_user.id, read_watermarks)
+                     for row in changed_rows if row["change_seq"] <= sync_token],
+        "deleted_message_ids": [row["message_id"] for row in tombstone_rows if row["change_seq"] <= sync_token],
+        "sync_token": sync_token,
+        "has_more": has_more,
+        # Прочитання не змінює рядків повідомлень - клієнт застосовує межі до своїх повідомлень сам
+        **read_watermarks_for(read_watermarks, current_user.id),
+    }
 
 
 @router.get("/attachments/{filename:path}")
 async def get_chat_attachment(
+        request: Request,
         filename: str = FastApiPath(...),  # Використовуємо FastApiPath
 ):
-    file_on_disk_path = os.path.join(UPLOAD_DIR, filename)
-    if not os.path.isfile(file_on_disk_path):
-        raise HTTPException(status_code=404, detail="Файл не знайдено")
+    blob_sha256 = parse_storage_name(filename)
+    if blob_sha256:
+        file_on_disk_path = blob_path(blob_sha256)
+    else:
+        file_on_disk_path = os.path.join(UPLOAD_DIR, filename)
     # Важливо: filename тут має бути безпечним, щоб уникнути Path Traversal.
     # FastAPI та os.path.join мають певний захист, але будьте обережні, якщо filename походить з неперевіреного джерела.
-    return FileResponse(path=file_on_disk_path,
-                        filename=os.path.basename(filename))  # Передаємо оригінальне ім'я для завантаження
+    # Для blob-ів хеш вмісту і є сильним ETag, а сам файл незмінний
+    return await conditional_file_response(request, file_on_disk_path,
+                                           os.path.basename(filename),  # Передаємо оригінальне ім'я для завантаження
+                                           etag=f'"{blob_sha256}"' if blob_sha256 else None,
+                                           immutable=bool(blob_sha256))
 
 
 @router.post("/{chat_id}/messages/read")
@@ -433,11 +882,31 @@ async def mark_messages_as_read_endpoint(
     if not chat_row or current_user.id not in [chat_row["user1_id"], chat_row["user2_id"]]: raise HTTPException(
         status_code=403, detail="Немає доступу до чату або чат не знайдено")
     partner_id = chat_row["user1_id"] if chat_row["user2_id"] == current_user.id else chat_row["user2_id"]
-    stmt = (update(message).where(
-        (message.c.chat_id == chat_id) & (message.c.sender_id == partner_id) & (message.c.is_read == False)).values(
-        is_read=True))
-    await session.execute(stmt)
+    if chat_row["user1_id"] == current_user.id:
+        last_read_column = chat.c.user1_last_read_message_id
+    else:
+        last_read_column = chat.c.user2_last_read_message_id
+    latest_partner_message_id = (
+        select(func.max(message.c.id))
+        .where((message.c.chat_id == chat_id) & (message.c.sender_id == partner_id))
+        .scalar_subquery()
+    )
+    # Одне оновлення рядка чату замість UPDATE кожного непрочитаного повідомлення. Умова робить межу
+    # монотонною: якщо нових повідомлень немає, рядок не змінюється і подія не розсилається
+    stmt = (
+        update(chat)
+        .where((chat.c.id == chat_id) & (last_read_column < latest_partner_message_id))
+        .values({last_read_column: latest_partner_message_id, chat.c.change_seq: chat.c.change_seq + 1})
+        .returning(last_read_column)
+    )
+    update_result = await session.execute(stmt)
+    last_read_message_id = update_result.scalar()
+    if last_read_message_id is not None:
+        await refresh_unread_counts(session, chat_id, current_user.id)
     await session.commit()
+    if last_read_message_id is not None:
+        await manager.broadcast_to_chat({"type": "messages_read", "chat_id": chat_id, "reader_id": current_user.id,
+                                         "last_read_message_id": last_read_message_id}, chat_id)
     return {"status": "success", "message": "Повідомлення від співрозмовника позначені як прочитані"}
 
 
@@ -464,24 +933,10 @@ async def delete_chat_endpoint(
     if current_user.id not in [chat_to_delete["user1_id"], chat_to_delete["user2_id"]]:
         raise HTTPException(status_code=403, detail="Not authorized to delete this chat")
 
-    # Видалення повідомлень (якщо немає ON DELETE CASCADE в БД)
-    # Або якщо є файли, пов'язані з повідомленнями, їх теж треба видалити з диску
-    messages_to_delete_query = select(message.c.id, message.c.file_path).where(message.c.chat_id == chat_id)
-    messages_to_delete_result = await session.execute(messages_to_delete_query)
-    for msg_to_del in messages_to_delete_result.mappings().fetchall():
-        if msg_to_del["file_path"]:
-            try:
-                os.remove(os.path.join(UPLOAD_DIR, msg_to_del["file_path"]))
-            except OSError:
-                # Логування помилки, якщо файл не знайдено або не вдалося видалити
-                pass  # Або raise, якщо це критично
-
-    delete_messages_stmt = delete(message).where(message.c.chat_id == chat_id)
-    await session.execute(delete_messages_stmt)
-
-    delete_chat_stmt = delete(chat).where(chat.c.id == chat_id)
-    await session.execute(delete_chat_stmt)
+    # Повідомлення, архів, вкладення та решта залежних рядків - так само, як при видаленні задачі чи стартапу
+    deleted_chats = await delete_chats(session, [chat_id])
     await session.commit()
+    await finish_chat_deletion(deleted_chats)
 
     return {"status": "success", "message": "Chat and its messages deleted successfully"}
 
@@ -518,51 +973,42 @@ async def edit_message_endpoint(
         raise HTTPException(status_code=400, detail="Текст повідомлення не може бути порожнім")
 
     updated_time = datetime.utcnow()
+    change_seq = await next_chat_change_seq(chat_id, session)
     update_stmt = (
         update(message)
-        .where(message.c.id == message_id)
+        # created_at з уже прочитаного рядка - UPDATE торкається лише одного місячного розділу
+        .where((message.c.id == message_id) & (message.c.created_at == msg_to_edit["created_at"]))
         .values(
             content=new_text,
             updated_at=updated_time,
-            is_edited=True
+            is_edited=True,
+            change_seq=change_seq
         )
         .returning(  # Повертаємо оновлені дані
             message.c.id, message.c.content, message.c.sender_id,
-            message.c.created_at, message.c.updated_at, message.c.is_edited, message.c.is_read,
+            message.c.created_at, message.c.updated_at, message.c.is_edited,
             message.c.file_path, message.c.original_file_name, message.c.mime_type
         )
     )
     updated_msg_result = await session.execute(update_stmt)
-    await session.commit()
-
+    watermarks_result = await session.execute(
+        select(chat.c.user1_id, chat.c.user2_id, chat.c.user1_last_read_message_id, chat.c.user2_last_read_message_id)
+        .where(chat.c.id == chat_id)
+    )
+    read_watermarks = chat_read_watermarks(watermarks_result.mappings().first())
     updated_msg_data = updated_msg_result.mappings().first()
     if not updated_msg_data:
         # Це не повинно трапитись, якщо .returning спрацював
         raise HTTPException(status_code=500, detail="Не вдалося оновити повідомлення")
+    await record_edited_message(session, chat_id, updated_msg_data)
+    await session.commit()
 
-    created_at_iso = (updated_msg_data["created_at"].isoformat() + "Z") if isinstance(updated_msg_data["created_at"],
-                                                                                      datetime) else str(
-        updated_msg_data["created_at"])
-    updated_at_iso = (updated_msg_data["updated_at"].isoformat() + "Z") if updated_msg_data[
-                                                                               "updated_at"] and isinstance(
-        updated_msg_data["updated_at"], datetime) else None
+    await manager.broadcast_to_chat(
+        {"type": "message_updated", "chat_id": chat_id,
+         "message": format_message(updated_msg_data, None, read_watermarks)}, chat_id)
 
-    # На фронтенді sender вже визначається, але тут можна повернути "me" для консистентності
-    sender_type = "me"  # Оскільки редагує завжди відправник
-
-    return {
-        "id": updated_msg_data["id"],
-        "text": updated_msg_data["content"],
-        "sender": sender_type,
-        "created_at": created_at_iso,
-        "updated_at": updated_at_iso,
-        "is_edited": updated_msg_data["is_edited"],
-        "is_read": updated_msg_data["is_read"],
-        "file_url": f"http://localhost:8000/chats/attachments/{updated_msg_data['file_path']}" if updated_msg_data[
-            'file_path'] else None,
-        "original_file_name": updated_msg_data["original_file_name"],
-        "mime_type": updated_msg_data["mime_type"]
-    }
+    # Редагує завжди відправник, тому sender буде "me"
+    return format_message(updated_msg_data, current_user.id, read_watermarks)
 
 
 # --- НОВИЙ ЕНДПОІНТ ДЛЯ ВИДАЛЕННЯ ПОВІДОМЛЕННЯ ---
@@ -574,7 +1020,8 @@ async def delete_message_endpoint(
         current_user: User = Depends(get_current_active_user_and_update_last_seen),
 ):
     # 1. Перевірка, чи існує повідомлення і чи належить воно користувачу
-    msg_select_stmt = select(message.c.id, message.c.sender_id, message.c.chat_id, message.c.file_path).where(
+    msg_select_stmt = select(message.c.id, message.c.sender_id, message.c.chat_id, message.c.file_path,
+                             message.c.created_at).where(
         (message.c.id == message_id) &
         (message.c.chat_id == chat_id)  # Переконуємось, що message_id належить цьому chat_id
     )
@@ -589,8 +1036,8 @@ async def delete_message_endpoint(
         # Поки що - тільки автор.
         raise HTTPException(status_code=403, detail="Ви не можете видалити це повідомлення")
 
-    # 2. Видалення файлу з диску, якщо він є
-    if msg_to_delete["file_path"]:
+    # 2. Видалення файлу з диску, якщо він є (файли blob-сховища прибирає collect_garbage)
+    if msg_to_delete["file_path"] and not parse_storage_name(msg_to_delete["file_path"]):
         try:
             file_on_disk = os.path.join(UPLOAD_DIR, msg_to_delete["file_path"])
             if os.path.isfile(file_on_disk):
@@ -599,10 +1046,24 @@ async def delete_message_endpoint(
             # Логування помилки видалення файлу, але продовжуємо видалення запису з БД
             print(f"Error deleting file {msg_to_delete['file_path']}: {e}")
 
-    # 3. Видалення повідомлення з бази даних
-    delete_stmt = delete(message).where(message.c.id == message_id)
+    # 3. Видалення повідомлення з бази даних; tombstone потрібен, щоб /sync повідомив клієнтам про видалення
+    change_seq = await next_chat_change_seq(chat_id, session)
+    delete_stmt = delete(message).where(
+        (message.c.id == message_id) & (message.c.created_at == msg_to_delete["created_at"]))
     await session.execute(delete_stmt)
+    await session.execute(insert(message_tombstone).values(
+        chat_id=chat_id,
+        message_id=message_id,
+        change_seq=change_seq,
+        deleted_at=datetime.utcnow()
+    ))
+    await record_deleted_message(session, chat_id, message_id)
+    released_blobs = await release_blobs(session, [msg_to_delete["file_path"]])
     await session.commit()
+    await collect_garbage(released_blobs)
+
+    await manager.broadcast_to_chat({"type": "message_deleted", "chat_id": chat_id, "message_id": message_id},
+                                    chat_id)
 
     # Для статусу 204 тіло відповіді не надсилається
     return None  # Або return Response(status_code=204)
@@ -624,17 +1085,46 @@ async def user_is_typing(
     if current_user.id not in [chat_row["user1_id"], chat_row["user2_id"]]:
         raise HTTPException(status_code=403, detail="Not authorized for this chat")
 
-    now_utc = datetime.utcnow()
-    update_values = {}
-    if chat_row["user1_id"] == current_user.id:
-        update_values = {"user1_last_typing_at": now_utc}
-    elif chat_row["user2_id"] == current_user.id:
-        update_values = {"user2_last_typing_at": now_utc}
+    # Стан набору тексту тримається лише в пам'яті: жодного UPDATE на кожне натискання клавіш
+    await mark_user_typing(chat_id, current_user.id)
+    return {"status": "success", "message": "Typing status updated"}
 
-    if update_values:
-        stmt = update(chat).where(chat.c.id == chat_id).values(**update_values)
-        await session.execute(stmt)
-        await session.commit()
-        return {"status": "success", "message": "Typing status updated"}
 
-    raise HTTPException(status_code=400, detail="Could not update typing status")
\ No newline at end of file
+@router.websocket("/ws")
+async def chat_websocket_endpoint(
+        websocket: WebSocket,
+        token: Optional[str] = Query(None),
+):
+    # Один сокет на вкладку: події всіх чатів користувача, і для списку чатів, і для відкритого чату
+    ws_user = await get_user_from_websocket_token(token)
+    if not ws_user:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    async with async_session_maker() as session:
+        result = await session.execute(select(chat_inbox.c.chat_id).where(chat_inbox.c.user_id == ws_user.id))
+        chat_ids = result.scalars().all()
+
+    connection = await manager.connect(websocket, ws_user.id, chat_ids)
+    presence_tracker.touch(ws_user.id)
+    try:
+        # Через чергу з'єднання, щоб не писати в сокет паралельно з розсилкою
+        connection.send_json({"type": "connected", "user_id": ws_user.id, "chat_ids": list(chat_ids)})
+        # Від клієнта приходять лише ping-и та події "друкує..." з chat_id
+        while True:
+            client_text = await websocket.receive_text()
+            # Будь-який кадр (і ping кожні 60 с) - heartbeat: поки вкладка відкрита, користувач онлайн
+            presence_tracker.touch(ws_user.id)
+            try:
+                client_event = json.loads(client_text)
+            except ValueError:
+                continue  # Звичайний текстовий ping
+            if not isinstance(client_event, dict) or client_event.get("type") != "typing":
+                continue
+            typing_chat_id = client_event.get("chat_id")
+            if typing_chat_id in connection.chat_ids:
+                await mark_user_typing(typing_chat_id, ws_user.id)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(connection)
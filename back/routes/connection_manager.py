@@ -1,48 +1,234 @@
 # app/chats/connection_manager.py
-from typing import Dict, List, Any
-from fastapi import WebSocket
+import asyncio
 import json
+from typing import Dict, Any, Awaitable, Callable, Iterable, List, Optional, Set, Union
+
+from fastapi import WebSocket, status
+
+from routes.pubsub import InProcessPubSub, create_pubsub
+
+# Скільки подій може чекати на відправку одному клієнту; хто відстав більше - відключається
+OUTBOUND_QUEUE_SIZE = 256
+# Клієнт, у якого одна відправка висить довше, відключається при наступній події
+SEND_TIMEOUT_SECONDS = 10
+CLOSE_TIMEOUT_SECONDS = 5
+
+# Задачі закриття відключених сокетів: цикл подій тримає задачі лише слабким посиланням
+_closing_tasks: Set[asyncio.Task] = set()
+
+
+class ChatConnection:
+    """Один WebSocket користувача (вкладка браузера), підписаний на всі його чати.
+
+    Має власну чергу вихідних подій і задачу, що їх пише: розсилка лише кладе готовий текст
+    у чергу й не чекає на мережу, тож повільний клієнт гальмує тільки себе.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, chat_ids: Iterable[int],
+                 on_evict: Callable[["ChatConnection"], None], queue_size: int = OUTBOUND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.chat_ids: Set[int] = set(chat_ids)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._on_evict = on_evict
+        self._writer_task: Optional[asyncio.Task] = None
+        self._sending_since: Optional[float] = None  # loop.time() початку поточної відправки
+        self.closed = False
+
+    def start(self):
+        self._writer_task = asyncio.create_task(self._write_loop())
+
+    def send_text(self, text: str):
+        if self.closed:
+            return
+        # Тайм-аут перевіряємо тут, а не через wait_for на кожну відправку: так не створюється
+        # зайва задача на кожне повідомлення кожного сокета
+        if self._sending_since is not None and \
+                asyncio.get_running_loop().time() - self._sending_since > SEND_TIMEOUT_SECONDS:
+            print(f"WebSocket of user {self.user_id} is stuck sending for over {SEND_TIMEOUT_SECONDS}s, disconnecting.")
+            self.evict()
+            return
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            print(f"WebSocket of user {self.user_id} lags behind by {self.queue.qsize()} events, disconnecting.")
+            self.evict()
+
+    def send_json(self, data: Dict[str, Any]):
+        self.send_text(json.dumps(data))
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                text = await self.queue.get()
+                self._sending_since = loop.time()
+                await self.websocket.send_text(text)
+                self._sending_since = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # WebSocketException або ConnectionClosed
+            print(f"Error sending message to a websocket of user {self.user_id}: {e}. Disconnecting.")
+            self.evict()
+
+    def evict(self):
+        if self.closed:
+            return
+        self.stop()
+        self._on_evict(self)
+        # Закриття теж може зависнути на повільному клієнті - не чекаємо на нього в місці виклику
+        closing_task = asyncio.get_running_loop().create_task(self._close_quietly())
+        _closing_tasks.add(closing_task)
+        closing_task.add_done_callback(_closing_tasks.discard)
+
+    async def _close_quietly(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER), CLOSE_TIMEOUT_SECONDS)
+        except Exception:
+            pass
+
+    def stop(self):
+        self.closed = True
+        if self._writer_task is not None and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+        self._writer_task = None
+
+
+class LongPollWaiter:
+    """Запит long-poll, що чекає на події чатів користувача.
+
+    Індексується разом із сокетами й отримує ті самі події, лише замість відправки
+    накопичує їх і будить запит.
+    """
+
+    def __init__(self, user_id: int, chat_ids: Iterable[int]):
+        self.user_id = user_id
+        self.chat_ids: Set[int] = set(chat_ids)
+        self._texts: List[str] = []
+        self._woken = asyncio.Event()
+        self.closed = False
+
+    def send_text(self, text: str):
+        if self.closed:
+            return
+        self._texts.append(text)
+        self._woken.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """True, якщо прийшла подія; False - якщо минув тайм-аут."""
+        try:
+            await asyncio.wait_for(self._woken.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def take_events(self) -> List[Dict[str, Any]]:
+        texts, self._texts = self._texts, []
+        self._woken.clear()
+        return [json.loads(text) for text in texts]
+
+    def stop(self):
+        self.closed = True
+
+
+Subscriber = Union[ChatConnection, LongPollWaiter]
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}  # chat_id: [WebSocket]
+    def __init__(self, pubsub: InProcessPubSub):
+        # Обидва індекси - множини, тож підключення й відключення коштують O(1)
+        self.user_connections: Dict[int, Set[Subscriber]] = {}  # user_id: {з'єднання й long-poll запити}
+        self.chat_subscribers: Dict[int, Set[Subscriber]] = {}  # chat_id: {з'єднання учасників}
+        # broadcast_to_chat публікує подію, а доставку на локальні сокети робить кожен процес сам
+        self.pubsub = pubsub
+        self.pubsub.subscribe(self._deliver_to_local_sockets)
+        self.pubsub.on_reconnect(self._resync_local_sockets)
+
+    def subscribe(self, handler: Callable[[Dict[str, Any], int], Awaitable[None]]):
+        """Додатковий обробник подій чатів з усіх процесів (наприклад, для стану "друкує...")."""
+        async def unwrap(event: Dict[str, Any]):
+            await handler(event["payload"], event["chat_id"])
+        self.pubsub.subscribe(unwrap)
 
-    async def connect(self, websocket: WebSocket, chat_id: int):
+    async def connect(self, websocket: WebSocket, user_id: int, chat_ids: Iterable[int]) -> ChatConnection:
         await websocket.accept()
-        if chat_id not in self.active_connections:
-            self.active_connections[chat_id] = []
-        self.active_connections[chat_id].append(websocket)
-        print(
-            f"WebSocket connected to chat {chat_id}. Total connections for chat: {len(self.active_connections[chat_id])}")
-
-    def disconnect(self, websocket: WebSocket, chat_id: int):
-        if chat_id in self.active_connections:
-            if websocket in self.active_connections[chat_id]:
-                self.active_connections[chat_id].remove(websocket)
-                print(f"WebSocket disconnected from chat {chat_id}.")
-                if not self.active_connections[chat_id]:
-                    del self.active_connections[chat_id]
-                    print(f"No more connections for chat {chat_id}, removing chat entry.")
-            else:
-                print(f"Attempted to disconnect a non-existent websocket from chat {chat_id}.")
-        else:
-            print(f"Attempted to disconnect websocket from non-existent chat entry {chat_id}.")
+        connection = ChatConnection(websocket, user_id, chat_ids, self._remove)
+        connection.start()
+        self._add(connection)
+        print(f"WebSocket connected for user {user_id} ({len(connection.chat_ids)} chats). "
+              f"Total connections for user: {len(self.user_connections[user_id])}")
+        return connection
+
+    def disconnect(self, connection: ChatConnection):
+        if not connection.closed:
+            connection.stop()
+        self._remove(connection)
+        print(f"WebSocket disconnected for user {connection.user_id}.")
+
+    def add_waiter(self, user_id: int, chat_ids: Iterable[int]) -> LongPollWaiter:
+        waiter = LongPollWaiter(user_id, chat_ids)
+        self._add(waiter)
+        return waiter
+
+    def remove_waiter(self, waiter: LongPollWaiter):
+        waiter.stop()
+        self._remove(waiter)
+
+    def _add(self, connection: Subscriber):
+        self.user_connections.setdefault(connection.user_id, set()).add(connection)
+        for chat_id in connection.chat_ids:
+            self.chat_subscribers.setdefault(chat_id, set()).add(connection)
+
+    def _remove(self, connection: Subscriber):
+        _discard(self.user_connections, connection.user_id, connection)
+        for chat_id in connection.chat_ids:
+            _discard(self.chat_subscribers, chat_id, connection)
 
     async def broadcast_to_chat(self, message_data: Dict[str, Any], chat_id: int):
-        if chat_id in self.active_connections:
-            print(f"Broadcasting to chat {chat_id}: {message_data}")
-            disconnected_sockets = []
-            for connection in self.active_connections[chat_id]:
-                try:
-                    await connection.send_json(message_data)
-                except Exception as e:  # WebSocketException or ConnectionClosed
-                    print(f"Error sending message to a websocket in chat {chat_id}: {e}. Marking for removal.")
-                    disconnected_sockets.append(connection)
-
-            # Видалення "мертвих" з'єднань
-            for sock in disconnected_sockets:
-                self.disconnect(sock, chat_id)
-
-
-manager = ConnectionManager()
\ No newline at end of file
+        await self.pubsub.publish({"chat_id": chat_id, "payload": message_data})
+
+    async def add_chat_members(self, chat_id: int, user_ids: Iterable[int], message_data: Dict[str, Any]):
+        """Підписує вже відкриті сокети користувачів (на всіх воркерах) на новий чат і розсилає подію."""
+        await self.pubsub.publish({"chat_id": chat_id, "payload": message_data, "subscribe_user_ids": list(user_ids)})
+
+    async def close_chat(self, chat_id: int, message_data: Dict[str, Any]):
+        """Остання подія видаленого чату; після неї сокети від нього відписуються."""
+        await self.pubsub.publish({"chat_id": chat_id, "payload": message_data, "close_chat": True})
+
+    async def _deliver_to_local_sockets(self, event: Dict[str, Any]):
+        chat_id = event["chat_id"]
+        for user_id in event.get("subscribe_user_ids", ()):
+            for connection in self.user_connections.get(user_id, ()):
+                connection.chat_ids.add(chat_id)
+                self.chat_subscribers.setdefault(chat_id, set()).add(connection)
+
+        chat_connections = self.chat_subscribers.get(chat_id)
+        if not chat_connections:
+            return
+        # Серіалізуємо один раз на подію, а не на кожен сокет
+        text = json.dumps(event["payload"])
+        for connection in list(chat_connections):
+            connection.send_text(text)
+
+        if event.get("close_chat"):
+            for connection in self.chat_subscribers.pop(chat_id, ()):
+                connection.chat_ids.discard(chat_id)
+
+    async def _resync_local_sockets(self):
+        # Поки слухач був відключений, події з інших воркерів не доходили - клієнти дотягують їх через /sync
+        text = json.dumps({"type": "chat_resync"})
+        for connections in list(self.user_connections.values()):
+            for connection in list(connections):
+                connection.send_text(text)
+
+
+def _discard(index: Dict[int, Set[Subscriber]], key: int, connection: Subscriber):
+    connections = index.get(key)
+    if connections is None:
+        return
+    connections.discard(connection)
+    if not connections:
+        del index[key]
+
+
+manager = ConnectionManager(create_pubsub())
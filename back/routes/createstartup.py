@@ -19,6 +19,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from datetime import datetime
 from models.models import startup, user as user_table  # імпортуємо модель стартапу
+from routes.response_cache import CATALOG_TAG, public_cache
 
 # Змінили префікс роутера на '/create_startup', щоб уникнути конфлікту
 router = APIRouter(
@@ -56,6 +57,7 @@ async def create_startup(
     # Виконання запиту
     await session.execute(new_startup)
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG)
 
     # Отримуємо дані для відповіді
     result = await session.execute(
@@ -28,6 +28,7 @@ from auth.manager import get_user_manager
 from fastapi_users import FastAPIUsers
 from auth.database import get_async_session, User
 from models.models import task, startup  # таблиці з БД
+from routes.response_cache import CATALOG_TAG, public_cache
 
 
 router = APIRouter(
@@ -62,6 +63,7 @@ async def create_task(
 
     await session.execute(new_task)
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG)
 
     result = await session.execute(
         select(task.c.id, task.c.title, task.c.description, task.c.startup_id, task.c.created_at)
@@ -10,6 +10,9 @@ from auth.manager import get_user_manager
 from fastapi_users import FastAPIUsers
 
 from models.models import startup, task, chat, rating, comment
+from routes.blob_store import release_blobs, collect_garbage
+from routes.chat_deletion import DeletedChats, delete_chats, finish_chat_deletion
+from routes.response_cache import CATALOG_TAG, public_cache, startup_comments_tag, task_tag
 
 from pydantic import BaseModel
 
@@ -73,6 +76,7 @@ async def update_startup_by_id(
         .values(name=data.name, description=data.description)
     )
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG)
 
     return StartupEditResponse(id=startup_id, name=data.name, description=data.description)
 
@@ -80,18 +84,23 @@ async def update_startup_by_id(
 @router.delete("/startup/{startup_id}")
 async def delete_startup_by_id(startup_id: int, session: AsyncSession = Depends(get_async_session)):
     # 1. Отримуємо всі task.id цього startup
-    result = await session.execute(select(task.c.id).where(task.c.startup_id == startup_id))
-    task_ids = [row[0] for row in result.fetchall()]
+    result = await session.execute(select(task.c.id, task.c.execution_image).where(task.c.startup_id == startup_id))
+    task_rows = result.fetchall()
+    task_ids = [row[0] for row in task_rows]
+    released_blobs = []
+    deleted_chats = DeletedChats([], [], [])
 
     if task_ids:
-        # 2. Видаляємо чати, прив'язані до цих завдань
-        await session.execute(delete(chat).where(chat.c.task_id.in_(task_ids)))
+        # 2. Видаляємо чати, прив'язані до цих завдань, разом з повідомленнями й вкладеннями
+        chat_ids_result = await session.execute(select(chat.c.id).where(chat.c.task_id.in_(task_ids)))
+        deleted_chats = await delete_chats(session, chat_ids_result.scalars().all())
 
         # 3. Видаляємо оцінки, прив'язані до цих завдань
         await session.execute(delete(rating).where(rating.c.task_id.in_(task_ids)))
 
         # 4. Видаляємо завдання
         await session.execute(delete(task).where(task.c.id.in_(task_ids)))
+        released_blobs = await release_blobs(session, [row[1] for row in task_rows])
 
     # 5. Видаляємо коментарі до стартапу
     await session.execute(delete(comment).where(comment.c.startup_id == startup_id))
@@ -100,4 +109,8 @@ async def delete_startup_by_id(startup_id: int, session: AsyncSession = Depends(
     await session.execute(delete(startup).where(startup.c.id == startup_id))
 
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG, startup_comments_tag(startup_id),
+                                  *[task_tag(task_id) for task_id in task_ids])
+    await collect_garbage(released_blobs)
+    await finish_chat_deletion(deleted_chats)
     return {"status": "Startup and all related data deleted"}
\ No newline at end of file
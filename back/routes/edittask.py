@@ -9,6 +9,9 @@ from auth.manager import get_user_manager
 from fastapi_users import FastAPIUsers
 
 from models.models import task, chat, rating, comment
+from routes.blob_store import release_blobs, collect_garbage
+from routes.chat_deletion import delete_chats, finish_chat_deletion
+from routes.response_cache import CATALOG_TAG, public_cache, task_tag
 
 from pydantic import BaseModel
 
@@ -72,6 +75,7 @@ async def update_task_by_id(
         .values(title=data.title, description=data.description)  # не оновлюємо статус
     )
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG, task_tag(task_id))
 
     return TaskEditResponse(id=task_id, title=data.title, description=data.description, status=row._mapping["status"])
 
@@ -85,12 +89,18 @@ async def delete_task_by_id(task_id: int, session: AsyncSession = Depends(get_as
     if not row:
         raise HTTPException(status_code=404, detail="Завдання не знайдено")
 
-    # Видалення з чату та рейтингу, а також самого завдання
-    await session.execute(delete(chat).where(chat.c.task_id == task_id))  # перевірте назву стовпця task_id
+    # Видалення чатів (разом з повідомленнями й вкладеннями) та рейтингу, а також самого завдання
+    chat_ids_result = await session.execute(select(chat.c.id).where(chat.c.task_id == task_id))
+    deleted_chats = await delete_chats(session, chat_ids_result.scalars().all())
     await session.execute(delete(rating).where(rating.c.task_id == task_id))  # те саме тут
     await session.execute(delete(task).where(task.c.id == task_id))  # id замість task_id
+    # Файл результату в blob-сховищі може бути спільним з іншими завданнями - лише зменшуємо лічильник
+    released_blobs = await release_blobs(session, [row._mapping["execution_image"]])
 
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG, task_tag(task_id))
+    await collect_garbage(released_blobs)
+    await finish_chat_deletion(deleted_chats)
     return {"status": "Завдання та всі пов'язані дані видалені"}
 
 
@@ -0,0 +1,109 @@
+# routes/file_storage.py
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, Request, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response
+
+from routes.http_cache import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, etag_matches
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class StoredUpload(NamedTuple):
+    size: int
+    sha256: str
+
+
+def _write_chunk(buffer, content_hash, chunk: bytes):
+    content_hash.update(chunk)
+    buffer.write(chunk)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def save_upload_streaming(upload: UploadFile, destination_path: str, max_size: int,
+                                chunk_size: int = UPLOAD_CHUNK_SIZE) -> StoredUpload:
+    """Пише файл на диск шматками в пулі потоків, рахуючи розмір і SHA-256 за один прохід.
+
+    Event loop ніколи не блокується на диску, а файл, що перевищує max_size, обривається
+    й видаляється, не дописуючись до кінця.
+    """
+    too_large = HTTPException(status_code=413,
+                              detail=f"Файл занадто великий. Максимальний розмір: {max_size // (1024 * 1024)}MB.")
+    # Розмір уже відомий після розбору multipart - відсікаємо завеликі файли ще до запису
+    if upload.size is not None and upload.size > max_size:
+        raise too_large
+
+    content_hash = hashlib.sha256()
+    size = 0
+    buffer = await run_in_threadpool(open, destination_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise too_large
+            await run_in_threadpool(_write_chunk, buffer, content_hash, chunk)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        await run_in_threadpool(_remove_quietly, destination_path)
+        raise
+    await run_in_threadpool(buffer.close)
+    return StoredUpload(size=size, sha256=content_hash.hexdigest())
+
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # Last-Modified має точність до секунди
+    return since is not None and since.tzinfo is not None and int(mtime) <= since.timestamp()
+
+
+async def conditional_file_response(request: Request, path: str, download_name: str,
+                                    etag: Optional[str] = None, immutable: bool = False,
+                                    media_type: Optional[str] = None) -> Response:
+    """FileResponse з ETag/Last-Modified, відповіддю 304 на умовний GET та Cache-Control.
+
+    Range / If-Range (докачування, перемотування відео) обробляє сам FileResponse,
+    порівнюючи If-Range з нашим ETag.
+    """
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Файл не знайдено")
+
+    if etag is None:
+        etag = f'"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+    validators = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        # Старі файли (UUID / name_timestamp) формально можуть бути перезаписані - тоді завжди валідуємо через ETag
+        "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+
+    # If-None-Match має пріоритет над If-Modified-Since (RFC 9110, 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = if_modified_since is not None and _not_modified_since(if_modified_since,
+                                                                             stat_result.st_mtime)
+    if not_modified:
+        return Response(status_code=304, headers=validators)
+
+    return FileResponse(path=path, filename=download_name, media_type=media_type,
+                        headers=validators, stat_result=stat_result)
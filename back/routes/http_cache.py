@@ -0,0 +1,41 @@
+# routes/http_cache.py
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request
+from starlette.responses import Response
+
+# Вміст за хеш-іменем ніколи не змінюється - браузер може не перепитувати сервер рік
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# Відповідь можна зберегти, але перед кожним використанням - перевірити через ETag
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+PUBLIC_REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Слабке порівняння (RFC 9110, 13.1.2): префікс W/ ігнорується
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def make_etag(*version_parts: Any) -> str:
+    # Слабкий ETag: той самий набір версій дає ту саму за змістом відповідь, але не обов'язково ті самі байти
+    digest = hashlib.sha1(repr(version_parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def check_not_modified(request: Request, response: Response, etag: str,
+                       cache_control: str = REVALIDATE_CACHE_CONTROL) -> Optional[Response]:
+    """Ставить ETag і Cache-Control на відповідь ендпоінта.
+
+    Якщо клієнт уже має цю версію (If-None-Match), повертає готову 304 - її треба віддати
+    одразу, не виконуючи основних запитів і не серіалізуючи тіло.
+    """
+    headers = {"etag": etag, "cache-control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
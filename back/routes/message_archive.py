@@ -0,0 +1,223 @@
+# routes/message_archive.py
+import asyncio
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from auth.database import engine
+from config import MESSAGE_ARCHIVE_AFTER_MONTHS
+from models.models import message_archive, message_client_id
+
+# Скільки місячних розділів messages тримати створеними наперед
+PARTITIONS_AHEAD_MONTHS = 3
+# Повідомлень одного чату в одному рядку архіву: сторінка історії читає щонайбільше два такі рядки
+ARCHIVE_CHUNK_SIZE = 500
+MAINTENANCE_INTERVAL_SECONDS = 6 * 60 * 60
+# Один воркер обслуговує розділи, решта пропускають цикл
+MAINTENANCE_LOCK_KEY = 0x6D736770  # "msgp"
+# Скільки пам'ятати client_id пакетної відправки: офлайн-черга клієнта повторює відправку значно раніше
+CLIENT_ID_RETENTION_DAYS = 30
+# Скільки тримати tombstone-и видалених повідомлень; клієнт, що не синхронізувався довше, перезавантажує чат
+TOMBSTONE_RETENTION_DAYS = 30
+
+PARTITION_NAME_RE = re.compile(r"^messages_p(\d{4})(\d{2})$")
+ARCHIVED_DATETIME_FIELDS = ("created_at", "updated_at")
+
+
+def add_months(month_start: date, months: int) -> date:
+    month_index = month_start.year * 12 + month_start.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _as_datetime(day: date) -> datetime:
+    # Колонки timestamp: asyncpg приймає лише datetime
+    return datetime(day.year, day.month, day.day)
+
+
+def partition_name(month_start: date) -> str:
+    return f"messages_p{month_start:%Y%m}"
+
+
+async def _list_partitions(connection: AsyncConnection) -> Dict[date, str]:
+    result = await connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = 'messages'"
+    ))
+    partitions = {}
+    for (name,) in result:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+async def _create_partition(connection: AsyncConnection, month_start: date):
+    month_end = add_months(month_start, 1)
+    name = partition_name(month_start)
+    # DDL не приймає параметрів; ім'я й межі будуються лише з дат
+    create_partition = text(
+        f"CREATE TABLE {name} PARTITION OF messages "
+        f"FOR VALUES FROM ('{month_start.isoformat()}') TO ('{month_end.isoformat()}')"
+    )
+    bounds = {"month_start": _as_datetime(month_start), "month_end": _as_datetime(month_end)}
+    in_default = await connection.execute(
+        text("SELECT 1 FROM messages_default WHERE created_at >= :month_start AND created_at < :month_end LIMIT 1"),
+        bounds,
+    )
+    if not in_default.first():
+        await connection.execute(create_partition)
+        return
+
+    # Рядки цього місяця вже потрапили в DEFAULT-розділ (обслуговування довго не запускалось), і Postgres
+    # не дасть створити розділ поверх них. Від'єднуємо DEFAULT, створюємо розділ, переносимо в нього
+    # рядки й повертаємо DEFAULT назад; до commit запис у messages чекає на блокування
+    await connection.execute(text("ALTER TABLE messages DETACH PARTITION messages_default"))
+    await connection.execute(create_partition)
+    moved = await connection.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM messages_default WHERE created_at >= :month_start AND created_at < :month_end
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), bounds)
+    await connection.execute(text("ALTER TABLE messages ATTACH PARTITION messages_default DEFAULT"))
+    print(f"Moved {moved.rowcount} messages for {month_start:%Y-%m} from messages_default into {name}.")
+
+
+async def _archive_partition(connection: AsyncConnection, month_start: date, name: str):
+    # SHARE блокує лише запис у цей (давно холодний) розділ; читання історії працює, доки триває копіювання
+    await connection.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+    await connection.execute(text(f"""
+        INSERT INTO message_archive (chat_id, period_start, first_message_id, last_message_id, first_created_at,
+                                     last_created_at, message_count, messages, file_paths)
+        SELECT chat_id, CAST(:period_start AS timestamp), min(id), max(id), min(created_at), max(created_at),
+               count(*),
+               jsonb_agg(jsonb_build_object(
+                   'id', id, 'sender_id', sender_id, 'content', content, 'created_at', created_at,
+                   'updated_at', updated_at, 'is_edited', is_edited, 'file_path', file_path,
+                   'original_file_name', original_file_name, 'mime_type', mime_type
+               ) ORDER BY created_at, id),
+               array_remove(array_agg(file_path), NULL)
+        FROM (
+            SELECT *, (row_number() OVER (PARTITION BY chat_id ORDER BY created_at, id) - 1) / :chunk_size AS chunk
+            FROM {name}
+        ) AS numbered
+        GROUP BY chat_id, chunk
+    """), {"period_start": _as_datetime(month_start), "chunk_size": ARCHIVE_CHUNK_SIZE})
+    # Ексклюзивне блокування messages береться лише на ці дві швидкі команди наприкінці транзакції;
+    # до commit читачі бачать повідомлення в розділі, після - в архіві
+    await connection.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+    await connection.execute(text(f"DROP TABLE {name}"))
+
+
+async def _purge_tombstones(connection: AsyncConnection):
+    # Разом з видаленням запам'ятовуємо в чаті межу: /sync з меншим since попросить повну синхронізацію
+    await connection.execute(text("""
+        WITH purged AS (
+            DELETE FROM message_tombstones WHERE deleted_at < :cutoff
+            RETURNING chat_id, change_seq
+        )
+        UPDATE chats SET tombstones_purged_seq = GREATEST(chats.tombstones_purged_seq, purged_by_chat.max_seq)
+        FROM (SELECT chat_id, max(change_seq) AS max_seq FROM purged GROUP BY chat_id) AS purged_by_chat
+        WHERE chats.id = purged_by_chat.chat_id
+    """), {"cutoff": datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)})
+
+
+async def maintain_message_partitions(today: Optional[date] = None):
+    """Створює розділи наперед і переносить у message_archive розділи, старші за MESSAGE_ARCHIVE_AFTER_MONTHS.
+
+    Кожен розділ обробляється окремою транзакцією, тож перерваний цикл нічого не ламає.
+    """
+    current_month = (today or datetime.utcnow().date()).replace(day=1)
+
+    async with engine.begin() as connection:
+        locked = await connection.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                                         {"key": MAINTENANCE_LOCK_KEY})
+        if not locked:
+            return
+        partitions = await _list_partitions(connection)
+        for offset in range(PARTITIONS_AHEAD_MONTHS + 1):
+            month_start = add_months(current_month, offset)
+            if month_start not in partitions:
+                await _create_partition(connection, month_start)
+        await connection.execute(delete(message_client_id).where(
+            message_client_id.c.created_at < datetime.utcnow() - timedelta(days=CLIENT_ID_RETENTION_DAYS)))
+        await _purge_tombstones(connection)
+
+    if MESSAGE_ARCHIVE_AFTER_MONTHS <= 0:
+        return
+    archive_before = add_months(current_month, -MESSAGE_ARCHIVE_AFTER_MONTHS)
+    for month_start, name in sorted(partitions.items()):
+        if month_start >= archive_before:
+            break
+        async with engine.begin() as connection:
+            locked = await connection.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                                             {"key": MAINTENANCE_LOCK_KEY})
+            if not locked:
+                return
+            await _archive_partition(connection, month_start, name)
+        print(f"Archived message partition {name}.")
+
+
+async def read_archived_messages(session: AsyncSession, chat_id: int, limit: int,
+                                 before_id: Optional[int] = None, after_id: Optional[int] = None,
+                                 newest_first: bool = True) -> List[Dict[str, Any]]:
+    """Сторінка історії з архіву в порядку обходу; рядки мають ті самі ключі, що й вибірка з messages."""
+    query = select(message_archive.c.messages).where(message_archive.c.chat_id == chat_id)
+    if before_id is not None:
+        query = query.where(message_archive.c.first_message_id < before_id)
+    if after_id is not None:
+        query = query.where(message_archive.c.last_message_id > after_id)
+    # Шматки одного чату не перетинаються за id, тож їх можна впорядкувати за last_message_id
+    order = message_archive.c.last_message_id.desc() if newest_first else message_archive.c.last_message_id.asc()
+    result = await session.execute(query.order_by(order).limit(limit // ARCHIVE_CHUNK_SIZE + 2))
+
+    archived_rows = []
+    for (chunk,) in result:
+        for archived in (reversed(chunk) if newest_first else chunk):
+            if (before_id is not None and archived["id"] >= before_id) or \
+                    (after_id is not None and archived["id"] <= after_id):
+                continue
+            for field in ARCHIVED_DATETIME_FIELDS:
+                if archived[field]:
+                    archived[field] = datetime.fromisoformat(archived[field])
+            archived_rows.append(archived)
+            if len(archived_rows) == limit:
+                return archived_rows
+    return archived_rows
+
+
+class MessagePartitionMaintainer:
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await maintain_message_partitions()
+            except Exception as e:
+                print(f"Message partition maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+message_partition_maintainer = MessagePartitionMaintainer()
+
+
+if __name__ == "__main__":
+    # Разовий запуск з cron або вручну: python -m routes.message_archive
+    asyncio.run(maintain_message_partitions())
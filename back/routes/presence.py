@@ -0,0 +1,89 @@
+# routes/presence.py
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import update, bindparam
+
+from auth.database import async_session_maker
+from models.models import user as user_table
+
+ONLINE_WINDOW = timedelta(minutes=5)
+FLUSH_INTERVAL_SECONDS = 15
+
+
+class PresenceTracker:
+    """Тримає heartbeat-и користувачів у пам'яті та періодично пакетно пише last_seen у БД."""
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self.flush_interval = flush_interval
+        self.last_seen: Dict[int, datetime] = {}  # user_id: останній heartbeat (naive UTC)
+        self.pending: Dict[int, datetime] = {}  # user_id: ще не записаний у БД last_seen
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def touch(self, user_id: int):
+        now = datetime.utcnow()
+        self.last_seen[user_id] = now
+        # Декілька heartbeat-ів між записами згортаються в один UPDATE з останнім часом
+        self.pending[user_id] = now
+
+    def forget(self, user_id: int):
+        # Явний вихід: не даємо відкладеному запису перезаписати last_seen = NULL
+        self.last_seen.pop(user_id, None)
+        self.pending.pop(user_id, None)
+
+    def get_last_seen(self, user_id: int, db_last_seen: Optional[datetime] = None) -> Optional[datetime]:
+        in_memory = self.last_seen.get(user_id)
+        if db_last_seen and db_last_seen.tzinfo:
+            db_last_seen = db_last_seen.replace(tzinfo=None)
+        if in_memory and db_last_seen:
+            return max(in_memory, db_last_seen)
+        return in_memory or db_last_seen
+
+    def is_online(self, user_id: int, db_last_seen: Optional[datetime] = None) -> bool:
+        # db_last_seen покриває heartbeat-и, які прийняв інший воркер і вже записав у БД
+        last_seen = self.get_last_seen(user_id, db_last_seen)
+        return bool(last_seen and datetime.utcnow() - last_seen < ONLINE_WINDOW)
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        stmt = (
+            update(user_table)
+            .where(user_table.c.id == bindparam("b_user_id"))
+            .values(last_seen=bindparam("b_last_seen"))
+        )
+        try:
+            async with async_session_maker() as session:
+                await session.execute(stmt, [
+                    {"b_user_id": user_id, "b_last_seen": seen_at} for user_id, seen_at in batch.items()
+                ])
+                await session.commit()
+        except Exception as e:
+            # Повертаємо незаписані heartbeat-и, якщо за цей час не з'явилось новіших
+            for user_id, seen_at in batch.items():
+                self.pending.setdefault(user_id, seen_at)
+            print(f"Failed to flush last_seen for {len(batch)} users: {e}")
+
+        stale_before = datetime.utcnow() - ONLINE_WINDOW
+        for user_id in [uid for uid, seen_at in self.last_seen.items() if seen_at < stale_before]:
+            del self.last_seen[user_id]
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+presence_tracker = PresenceTracker()
@@ -8,6 +8,8 @@ from auth.auth import auth_backend
 from auth.database import get_async_session, User
 from auth.manager import get_user_manager
 from models.models import startup, task, user as user_table, rating, comment
+from routes.batch_loading import load_grouped
+from routes.response_cache import CATALOG_TAG, public_cache, startup_comments_tag, task_tag
 from fastapi_users import FastAPIUsers
 from pydantic import BaseModel
 from datetime import datetime, timezone  # Додано timezone
@@ -184,6 +186,7 @@ async def refuse_task_endpoint(
     )
     await session.execute(stmt)
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG, task_tag(task_id))
 
     return {"message": "Ви успішно відмовилися від завдання. Воно було повернено в пул доступних завдань."}
 
@@ -200,42 +203,47 @@ async def get_user_startups_with_comments_and_tasks(
     if not startup_rows:
         return []
 
+    # Задачі й коментарі всіх стартапів - по одному запиту, хоч би скільки стартапів мав власник
+    startup_ids = [s_row.id for s_row in startup_rows]
+    tasks_by_startup = await load_grouped(
+        session,
+        select(task.c.id, task.c.title, task.c.description, task.c.status, task.c.startup_id).order_by(task.c.id),
+        task.c.startup_id, startup_ids,
+    )
+    comments_by_startup = await load_grouped(
+        session,
+        select(
+            comment.c.id,
+            comment.c.text,
+            comment.c.created_at,  # Отримуємо з БД
+            comment.c.user_id,
+            comment.c.startup_id,
+            user_table.c.username.label("author_username")
+        )
+        .select_from(comment.join(user_table, comment.c.user_id == user_table.c.id))
+        .order_by(asc(comment.c.created_at)),
+        comment.c.startup_id, startup_ids,
+    )
+
     response_startups = []
     for s_row in startup_rows:
         startup_data = s_row._asdict()
         current_startup_id = startup_data["id"]
 
-        tasks_stmt = select(task.c.id, task.c.title, task.c.description, task.c.status).where(
-            task.c.startup_id == current_startup_id)
-        tasks_result = await session.execute(tasks_stmt)
         tasks_for_startup = [
-            TaskInStartupResponse(id=t.id, title=t.title, description=t.description, status=t.status)
-            for t in tasks_result.fetchall()
+            TaskInStartupResponse(id=t["id"], title=t["title"], description=t["description"], status=t["status"])
+            for t in tasks_by_startup[current_startup_id]
         ]
 
-        comments_stmt = (
-            select(
-                comment.c.id,
-                comment.c.text,
-                comment.c.created_at,  # Отримуємо з БД
-                comment.c.user_id,
-                user_table.c.username.label("author_username")
-            )
-            .select_from(comment.join(user_table, comment.c.user_id == user_table.c.id))
-            .where(comment.c.startup_id == current_startup_id)
-            .order_by(asc(comment.c.created_at))
-        )
-        comments_result = await session.execute(comments_stmt)
-
         comments_for_startup = []
-        for c_row in comments_result.fetchall():
+        for c_row in comments_by_startup[current_startup_id]:
             comments_for_startup.append(
                 CommentWithAuthorResponse(
-                    id=c_row.id,
-                    text=c_row.text,
-                    created_at=ensure_aware_utc(c_row.created_at),  # Перетворення
-                    user_id=c_row.user_id,
-                    author_username=c_row.author_username
+                    id=c_row["id"],
+                    text=c_row["text"],
+                    created_at=ensure_aware_utc(c_row["created_at"]),  # Перетворення
+                    user_id=c_row["user_id"],
+                    author_username=c_row["author_username"]
                 )
             )
 
@@ -305,6 +313,7 @@ async def owner_remove_task_executor(
     )
     await session.execute(update_stmt)
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG, task_tag(task_id))
 
     return {"message": "Виконавця успішно відключено від завдання. Статус завдання оновлено на 'pending'."}
 
@@ -336,6 +345,7 @@ async def update_task_status(
         .values(status=payload.status)
     )
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG, task_tag(task_id))
 
     return {"message": f"Статус задачі оновлено на '{payload.status}'"}
 
@@ -392,4 +402,5 @@ async def delete_startup_comment_by_owner(
     delete_stmt = comment.delete().where(comment.c.id == comment_id)
     await session.execute(delete_stmt)
     await session.commit()
+    await public_cache.invalidate(startup_comments_tag(startup_id))
     return
\ No newline at end of file
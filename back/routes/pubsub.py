@@ -0,0 +1,143 @@
+# routes/pubsub.py
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import asyncpg
+from sqlalchemy import text
+
+from auth.database import engine
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, CHAT_PUBSUB_BACKEND
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+ReconnectHandler = Callable[[], Awaitable[None]]
+
+NOTIFY_CHANNEL = "chat_events"
+# Postgres обмежує payload NOTIFY 8000 байтами; беремо з запасом
+NOTIFY_MAX_PAYLOAD_BYTES = 7900
+
+
+class InProcessPubSub:
+    """Події доходять лише до сокетів цього ж процесу (один воркер uvicorn)."""
+
+    def __init__(self):
+        self.handlers: List[EventHandler] = []
+        self.reconnect_handlers: List[ReconnectHandler] = []
+
+    def subscribe(self, handler: EventHandler):
+        self.handlers.append(handler)
+
+    def on_reconnect(self, handler: ReconnectHandler):
+        """Обробник, що викликається, коли доставку відновлено після обриву - події за цей час загублено."""
+        self.reconnect_handlers.append(handler)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: Dict[str, Any]):
+        await self._dispatch(event)
+
+    async def _dispatch(self, event: Dict[str, Any]):
+        for handler in self.handlers:
+            try:
+                await handler(event)
+            except Exception as e:
+                print(f"Chat event handler failed: {e}")
+
+    async def _notify_reconnected(self):
+        for handler in self.reconnect_handlers:
+            try:
+                await handler()
+            except Exception as e:
+                print(f"Chat pub/sub reconnect handler failed: {e}")
+
+
+class PostgresPubSub(InProcessPubSub):
+    """Розсилка між воркерами через LISTEN/NOTIFY у нашій же БД, без окремого брокера."""
+
+    def __init__(self, dsn: str, channel: str = NOTIFY_CHANNEL):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._listen_connection: Optional[asyncpg.Connection] = None
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._dispatch_task: Optional[asyncio.Task] = None
+        # Цикл подій тримає задачі лише слабким посиланням - без нашого перепідключення може зникнути
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        # Одна задача розбирає чергу, тож події доставляються в порядку отримання NOTIFY
+        self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+        await self._listen()
+
+    async def stop(self):
+        self._stopping = True
+        if self._listen_connection is not None:
+            await self._listen_connection.close()
+            self._listen_connection = None
+        if self._dispatch_task is not None:
+            self._dispatch_task.cancel()
+            self._dispatch_task = None
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+    async def publish(self, event: Dict[str, Any]):
+        payload = json.dumps(event)
+        if len(payload.encode("utf-8")) > NOTIFY_MAX_PAYLOAD_BYTES:
+            # Завелика подія не влазить у NOTIFY: просимо клієнтів дотягнути зміни через /sync
+            payload = json.dumps({**event, "payload": {"type": "chat_resync", "chat_id": event["chat_id"]}})
+        # Процес-відправник теж слухає канал, тому локальні сокети отримають подію тим самим шляхом
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                     {"channel": self.channel, "payload": payload})
+            await connection.commit()
+
+    async def _listen(self):
+        self._listen_connection = await asyncpg.connect(self.dsn)
+        self._listen_connection.add_termination_listener(self._on_connection_lost)
+        await self._listen_connection.add_listener(self.channel, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._incoming.put_nowait(payload)
+
+    def _on_connection_lost(self, connection):
+        if self._stopping or (self._reconnect_task is not None and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 1
+        while not self._stopping:
+            try:
+                await self._listen()
+                print("Chat pub/sub listener reconnected.")
+                await self._notify_reconnected()
+                return
+            except Exception as e:
+                print(f"Chat pub/sub listener reconnect failed: {e}. Retrying in {delay}s.")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def _dispatch_loop(self):
+        while True:
+            payload = await self._incoming.get()
+            try:
+                event = json.loads(payload)
+            except ValueError:
+                continue
+            await self._dispatch(event)
+            # Під час сплеску NOTIFY черга не порожніє, і get() не поступається циклом подій -
+            # даємо задачам-записувачам сокетів і запитам виконатися між подіями
+            await asyncio.sleep(0)
+
+
+def create_pubsub(channel: str = NOTIFY_CHANNEL) -> InProcessPubSub:
+    if CHAT_PUBSUB_BACKEND == "postgres":
+        return PostgresPubSub(f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}", channel)
+    return InProcessPubSub()
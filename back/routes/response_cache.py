@@ -0,0 +1,126 @@
+# routes/response_cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, NamedTuple, Tuple
+
+from fastapi import Request
+from starlette.responses import Response
+
+from config import PUBLIC_CACHE_MAX_ENTRIES, PUBLIC_CACHE_TTL_SECONDS
+from routes.http_cache import PUBLIC_REVALIDATE_CACHE_CONTROL, etag_matches, make_etag
+from routes.pubsub import InProcessPubSub, create_pubsub
+
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+
+# Теги: каталог /startups/ залежить від усіх стартапів і задач, решта - від одного запису
+CATALOG_TAG = "catalog"
+
+
+def startup_comments_tag(startup_id: int) -> str:
+    return f"startup_comments:{startup_id}"
+
+
+def task_tag(task_id: int) -> str:
+    return f"task:{task_id}"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    expires_at: float
+    generations: Tuple[int, ...]  # Покоління тегів на момент, коли почали читати дані з БД
+
+
+class ResponseCache:
+    """LRU з TTL для публічних відповідей, однакових для всіх відвідувачів.
+
+    Кожен воркер тримає власну копію; інвалідація за тегами розсилається всім воркерам
+    через pub/sub (LISTEN/NOTIFY при CHAT_PUBSUB_BACKEND=postgres). Сповіщення, загублені під час
+    перепідключення слухача, не відновити - тоді кеш воркера очищується повністю.
+    """
+
+    def __init__(self, pubsub: InProcessPubSub, max_entries: int = PUBLIC_CACHE_MAX_ENTRIES,
+                 ttl: float = PUBLIC_CACHE_TTL_SECONDS):
+        self.pubsub = pubsub
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[str, ...], CachedResponse]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self.pubsub.subscribe(self._on_invalidate)
+        self.pubsub.on_reconnect(self._on_reconnect)
+
+    def _current_generations(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def _get(self, key: Hashable) -> CachedResponse | None:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        tags, entry = item
+        # Запис, зібраний до інвалідації будь-якого свого тегу, вже недійсний
+        if entry.expires_at <= time.monotonic() or entry.generations != self._current_generations(tags):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _set(self, key: Hashable, tags: Tuple[str, ...], entry: CachedResponse):
+        self._entries[key] = (tags, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, key: Hashable, tags: Iterable[str],
+                          load: Callable[[], Awaitable[bytes]]) -> CachedResponse:
+        """load повертає готове JSON-тіло; читає БД лише при промаху."""
+        tags = tuple(tags)
+        entry = self._get(key)
+        if entry is None:
+            # Покоління фіксуємо до читання БД: якщо запис інвалідують, поки ми читаємо,
+            # зібрана відповідь одразу вважатиметься застарілою
+            generations = self._current_generations(tags)
+            body = await load()
+            entry = CachedResponse(body, make_etag(body), time.monotonic() + self.ttl, generations)
+            self._set(key, tags, entry)
+        return entry
+
+    async def invalidate(self, *tags: str):
+        """Викликати після commit транзакції, що змінила дані з цими тегами.
+
+        Локальні покоління збільшуються одразу - наступний запит до цього воркера вже не
+        побачить старої відповіді, навіть поки сповіщення йде через pub/sub. Власне ехо
+        лише ще раз збільшить покоління. Помилку розсилки не прокидаємо: дані вже
+        закомічено, а інші воркери в гіршому разі віддадуть старе до кінця TTL.
+        """
+        if not tags:
+            return
+        tags = sorted(set(tags))
+        self._bump_generations(tags)
+        try:
+            await self.pubsub.publish({"tags": tags})
+        except Exception as e:
+            print(f"Failed to publish cache invalidation for {tags}: {e}")
+
+    def _bump_generations(self, tags: Iterable[str]):
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    async def _on_invalidate(self, event: Dict[str, Any]):
+        self._bump_generations(event.get("tags", ()))
+
+    async def _on_reconnect(self):
+        self._entries.clear()
+
+
+async def cached_json_response(request: Request, key: Hashable, tags: Iterable[str],
+                               load: Callable[[], Awaitable[bytes]],
+                               cache_control: str = PUBLIC_REVALIDATE_CACHE_CONTROL) -> Response:
+    entry = await public_cache.get_or_load(key, tags, load)
+    headers = {"etag": entry.etag, "cache-control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+public_cache = ResponseCache(create_pubsub(CACHE_INVALIDATION_CHANNEL))
@@ -1,16 +1,17 @@
 # routes/startups.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi_users import FastAPIUsers
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert # select вже імпортовано, insert теж
-from typing import List
-from pydantic import BaseModel
+from sqlalchemy import select, insert, exists, func, tuple_ # select вже імпортовано, insert теж
+from typing import List, Literal, Optional
+from pydantic import BaseModel, TypeAdapter
 
 from auth.database import get_async_session, User # User потрібен для FastAPIUsers
 from auth.manager import get_user_manager
 from models.models import startup, task, user, comment as comment_table # Імпортуємо startup як Table
 from auth.auth import auth_backend
+from routes.response_cache import CATALOG_TAG, cached_json_response, public_cache, startup_comments_tag
 from datetime import datetime, timezone
 
 router = APIRouter(
@@ -23,6 +24,9 @@ fastapi_users = FastAPIUsers[User, int](
     [auth_backend],
 )
 
+# Задача, яку ще можна взяти в роботу (фільтр has_open_tasks)
+OPEN_TASK_STATUS = "pending"
+
 def ensure_aware_utc(dt: datetime | None) -> datetime | None:
     if dt and dt.tzinfo is None:
         return dt.replace(tzinfo=timezone.utc)
@@ -49,10 +53,15 @@ class StartupSchema(BaseModel):
     description: str | None
     owner_username: str
     tasks: List[TaskSchema] # Тепер TaskSchema містить статус
+    task_count: int  # Усього задач стартапу; tasks може бути обрізано параметром tasks_limit
 
     class Config:
         orm_mode = True
 
+class StartupPageSchema(BaseModel):
+    startups: List[StartupSchema]
+    next_cursor: Optional[str]  # None - це остання сторінка
+
 class CommentCreateSchema(BaseModel):
     text: str
 
@@ -63,9 +72,48 @@ class CommentSchema(BaseModel):
     author: str
     class Config: orm_mode = True
 
+comment_list_adapter = TypeAdapter(List[CommentSchema])
+
+
+def parse_catalog_cursor(cursor: str, sort: str):
+    try:
+        if sort == "name":
+            name, startup_id = cursor.rsplit(":", 1)  # Назва сама може містити двокрапку
+            return name, int(startup_id)
+        return None, int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некоректний курсор")
+
+
+@router.get("/", response_model=StartupPageSchema)
+async def get_startups(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),  # next_cursor з попередньої сторінки
+    sort: Literal["newest", "oldest", "name"] = Query("newest"),
+    q: Optional[str] = Query(None, max_length=200),  # Пошук за назвою
+    owner_id: Optional[int] = Query(None),
+    task_status: Optional[str] = Query(None),  # Лише стартапи, що мають задачу з цим статусом
+    has_open_tasks: Optional[bool] = Query(None),
+    tasks_limit: Optional[int] = Query(None, ge=1, le=100),  # Скільки задач віддати на кожен стартап
+    session: AsyncSession = Depends(get_async_session),
+):
+    # Каталог однаковий для всіх відвідувачів: кешуємо готове тіло на кожну сторінку й набір фільтрів
+    cursor_name, cursor_id = parse_catalog_cursor(cursor, sort) if cursor else (None, None)
+
+    async def load() -> bytes:
+        page = await load_startup_page(session, limit, sort, cursor_name, cursor_id, q, owner_id, task_status,
+                                       has_open_tasks, tasks_limit)
+        return page.model_dump_json().encode("utf-8")
+
+    cache_key = ("startups", tuple(sorted(request.query_params.multi_items())))
+    return await cached_json_response(request, cache_key, [CATALOG_TAG], load)
 
-@router.get("/", response_model=List[StartupSchema])
-async def get_startups(session: AsyncSession = Depends(get_async_session)):
+
+async def load_startup_page(session: AsyncSession, limit: int, sort: str, cursor_name: Optional[str],
+                            cursor_id: Optional[int], q: Optional[str], owner_id: Optional[int],
+                            task_status: Optional[str], has_open_tasks: Optional[bool],
+                            tasks_limit: Optional[int]) -> StartupPageSchema:
     # JOIN startups з user по owner_id
     stmt_startups = ( # Перейменовано змінну для уникнення конфлікту, якщо startup - це імпорт
         select(
@@ -76,45 +124,95 @@ async def get_startups(session: AsyncSession = Depends(get_async_session)):
         )
         .select_from(startup.join(user, startup.c.owner_id == user.c.id))
     )
-    result_startups = await session.execute(stmt_startups)
-    startups_raw = result_startups.fetchall()
+    if q and q.strip():
+        stmt_startups = stmt_startups.where(startup.c.name.icontains(q.strip(), autoescape=True))
+    if owner_id is not None:
+        stmt_startups = stmt_startups.where(startup.c.owner_id == owner_id)
+    if task_status is not None:
+        stmt_startups = stmt_startups.where(
+            exists().where((task.c.startup_id == startup.c.id) & (task.c.status == task_status)))
+    if has_open_tasks is not None:
+        has_open = exists().where((task.c.startup_id == startup.c.id) & (task.c.status == OPEN_TASK_STATUS))
+        stmt_startups = stmt_startups.where(has_open if has_open_tasks else ~has_open)
 
-    # Отримуємо всі задачі з їх статусами
-    result_tasks = await session.execute(
-        select(task.c.id, task.c.title, task.c.startup_id, task.c.status) # Додано task.c.status
-    )
-    tasks_raw = result_tasks.fetchall()
+    # Курсорна пагінація: наступна сторінка починається одразу після останнього рядка попередньої
+    if sort == "name":
+        if cursor_id is not None:
+            stmt_startups = stmt_startups.where(tuple_(startup.c.name, startup.c.id) > (cursor_name, cursor_id))
+        stmt_startups = stmt_startups.order_by(startup.c.name.asc(), startup.c.id.asc())
+    elif sort == "oldest":
+        if cursor_id is not None:
+            stmt_startups = stmt_startups.where(startup.c.id > cursor_id)
+        stmt_startups = stmt_startups.order_by(startup.c.id.asc())
+    else:
+        if cursor_id is not None:
+            stmt_startups = stmt_startups.where(startup.c.id < cursor_id)
+        stmt_startups = stmt_startups.order_by(startup.c.id.desc())
+
+    result_startups = await session.execute(stmt_startups.limit(limit + 1))
+    startups_raw = result_startups.mappings().fetchall()
+    has_more = len(startups_raw) > limit
+    startups_raw = startups_raw[:limit]
 
-    # Мапа: startup_id -> список задач
+    # Задачі лише стартапів цієї сторінки, щонайбільше tasks_limit на кожен
     task_map = {}
-    for t_row in tasks_raw: # Змінено назву змінної для ітерації
-        t_data = t_row._mapping # Використовуємо _mapping для доступу до даних рядка
-        task_map.setdefault(t_data["startup_id"], []).append(
-            TaskSchema(id=t_data["id"], title=t_data["title"], status=t_data["status"]) # Передаємо статус
+    task_counts = {}
+    if startups_raw:
+        ranked_tasks = (
+            select(
+                task.c.id, task.c.title, task.c.startup_id, task.c.status,
+                func.row_number().over(partition_by=task.c.startup_id, order_by=task.c.id).label("position"),
+                func.count().over(partition_by=task.c.startup_id).label("task_count"),
+            )
+            .where(task.c.startup_id.in_([s_data["id"] for s_data in startups_raw]))
+            .subquery()
         )
+        stmt_tasks = select(ranked_tasks).order_by(ranked_tasks.c.startup_id, ranked_tasks.c.position)
+        if tasks_limit is not None:
+            stmt_tasks = stmt_tasks.where(ranked_tasks.c.position <= tasks_limit)
+        result_tasks = await session.execute(stmt_tasks)
+        for t_data in result_tasks.mappings():
+            task_map.setdefault(t_data["startup_id"], []).append(
+                TaskSchema(id=t_data["id"], title=t_data["title"], status=t_data["status"]) # Передаємо статус
+            )
+            task_counts[t_data["startup_id"]] = t_data["task_count"]
 
     # Формування відповіді
     startups_with_tasks = []
-    for s_row in startups_raw: # Змінено назву змінної для ітерації
-        s_data = s_row._mapping
+    for s_data in startups_raw: # Змінено назву змінної для ітерації
         startups_with_tasks.append(
             StartupSchema(
                 id=s_data["id"],
                 name=s_data["name"],
                 description=s_data["description"],
                 owner_username=s_data["owner_username"],
-                tasks=task_map.get(s_data["id"], [])
+                tasks=task_map.get(s_data["id"], []),
+                task_count=task_counts.get(s_data["id"], 0),
             )
         )
-    return startups_with_tasks
+
+    next_cursor = None
+    if has_more:
+        last = startups_raw[-1]
+        next_cursor = f"{last['name']}:{last['id']}" if sort == "name" else str(last["id"])
+    return StartupPageSchema(startups=startups_with_tasks, next_cursor=next_cursor)
 
 
 
 @router.get("/{startup_id}/comments", response_model=List[CommentSchema])
 async def get_comments_for_startup(
+    request: Request,
     startup_id: int,
     session: AsyncSession = Depends(get_async_session)
 ):
+    async def load() -> bytes:
+        return comment_list_adapter.dump_json(await load_startup_comments(session, startup_id))
+
+    return await cached_json_response(request, ("startup_comments", startup_id),
+                                      [startup_comments_tag(startup_id)], load)
+
+
+async def load_startup_comments(session: AsyncSession, startup_id: int) -> List[CommentSchema]:
     stmt = (
         select(
             comment_table.c.id,
@@ -177,6 +275,7 @@ async def add_comment_to_startup(
 
     result = await session.execute(stmt)
     await session.commit()
+    await public_cache.invalidate(startup_comments_tag(startup_id))
     new_comment_row = result.fetchone()
 
     if not new_comment_row:
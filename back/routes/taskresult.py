@@ -1,9 +1,8 @@
 # У вашому файлі з роутером /user (наприклад, user.py або main.py)
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from fastapi.responses import FileResponse  # Додано для відправки файлів
 import os  # Додано для роботи зі шляхами
 
 from auth.manager import get_user_manager
@@ -12,7 +11,10 @@ from pydantic import BaseModel
 from auth.database import get_async_session, User  # Переконайтесь, що User імпортований
 from auth.auth import auth_backend  # Переконайтесь, що auth_backend імпортований
 from fastapi_users import FastAPIUsers
-from typing import Optional  # Додано для Optional полів
+from typing import Dict, Optional  # Додано для Optional полів
+from routes.blob_store import parse_storage_name, blob_path
+from routes.file_storage import conditional_file_response
+from routes.thumbnails import thumbnail_urls
 
 router = APIRouter(
     prefix="/user",
@@ -35,7 +37,9 @@ class TaskResultResponse(BaseModel):
     title: str
     description: str
     executionResult: str
-    attachedFileName: Optional[str] = None
+    attachedFileName: Optional[str] = None  # Оригінальна назва файлу для збереження у користувача
+    attachedFileKey: Optional[str] = None  # Ім'я для /user/download_attachment/{filename}
+    attachedFileThumbnails: Optional[Dict[str, str]] = None  # Розмір прев'ю (px): URL
     isRatedByCustomer: bool = False # Нове поле, за замовчуванням false
 
     class Config:
@@ -77,11 +81,14 @@ async def get_task_result(
         is_rated = True
 
     file_name = None
+    file_key = None
     if task_data.get("execution_image"):
         try:
-            file_name = os.path.basename(task_data["execution_image"])
+            file_key = os.path.basename(task_data["execution_image"])
+            file_name = task_data.get("execution_file_name") or file_key
         except Exception:
             file_name = None
+            file_key = None
 
     return TaskResultResponse(
         id=task_data["id"],
@@ -89,25 +96,33 @@ async def get_task_result(
         description=task_data["description"],
         executionResult=task_data["execution_description"] or "Опис виконання відсутній.",
         attachedFileName=file_name,
+        attachedFileKey=file_key,
+        attachedFileThumbnails=thumbnail_urls(file_key),
         isRatedByCustomer=is_rated # Додаємо нове поле у відповідь
     )
 
 
 # Новий ендпоінт для завантаження файлу, прикріпленого до завдання
 @router.get("/download_attachment/{filename}")
-async def download_task_attachment(filename: str):
+async def download_task_attachment(filename: str, request: Request):
     # Базовий захист від path traversal атак
     if ".." in filename or filename.startswith("/") or filename.startswith("\\"):
         raise HTTPException(status_code=400, detail="Некоректне ім'я файлу.")
 
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    blob_sha256 = parse_storage_name(filename)
+    if blob_sha256:
+        file_path = blob_path(blob_sha256)
+    else:
+        file_path = os.path.join(UPLOAD_DIR, filename)  # Файли, завантажені до появи blob-сховища
 
     if not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="Файл не знайдено на сервері.")
 
-    # FileResponse автоматично встановлює відповідні Content-Type на основі розширення файлу
-    # і Content-Disposition для завантаження
-    return FileResponse(path=file_path, filename=filename, media_type='application/octet-stream')
+    # Content-Disposition для завантаження, ETag/304 для повторних запитів, Range для докачування
+    return await conditional_file_response(request, file_path, filename,
+                                           etag=f'"{blob_sha256}"' if blob_sha256 else None,
+                                           immutable=bool(blob_sha256),
+                                           media_type='application/octet-stream')
 
 
 @router.post("/{task_id}/rate")
@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi_users import FastAPIUsers
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, insert
+from sqlalchemy import select, update, insert, func
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 
 from auth.auth import auth_backend
 from auth.database import get_async_session, User
 from auth.manager import get_user_manager
 from models.models import task, user as user_table, chat  # <=== уникаємо конфлікту назв
+from routes.http_cache import PUBLIC_REVALIDATE_CACHE_CONTROL, check_not_modified, make_etag
+from routes.response_cache import CATALOG_TAG, cached_json_response, public_cache, task_tag
+from routes.startups import ensure_aware_utc
 
 router = APIRouter(
     prefix="/tasks",
@@ -25,9 +28,31 @@ class TaskDetailSchema(BaseModel):
     owner_name: Optional[str]
 
 
+# Для списку: без повного description, дату серіалізує pydantic, а не strftime на кожен рядок
+class TaskSummarySchema(BaseModel):
+    id: int
+    title: str
+    created_at: Optional[datetime]
+    status: str
+    startup_id: Optional[int]
+    owner_name: Optional[str]
+
+
+class TaskPageSchema(BaseModel):
+    tasks: List[TaskSummarySchema]
+    next_cursor: Optional[str]  # None - це остання сторінка
+
+
 # Отримати одну задачу по ID
 @router.get("/{task_id}", response_model=TaskDetailSchema)
-async def get_task(task_id: int, session: AsyncSession = Depends(get_async_session)):
+async def get_task(request: Request, task_id: int, session: AsyncSession = Depends(get_async_session)):
+    async def load() -> bytes:
+        return (await load_task_detail(session, task_id)).model_dump_json().encode("utf-8")
+
+    return await cached_json_response(request, ("task", task_id), [task_tag(task_id)], load)
+
+
+async def load_task_detail(session: AsyncSession, task_id: int) -> TaskDetailSchema:
     result = await session.execute(
         select(
             task.c.id,
@@ -54,34 +79,73 @@ async def get_task(task_id: int, session: AsyncSession = Depends(get_async_sessi
     return TaskDetailSchema(**row_dict)
 
 
-# Отримати список усіх задач
-@router.get("/", response_model=List[TaskDetailSchema])
-async def list_tasks(session: AsyncSession = Depends(get_async_session)):
-    result = await session.execute(
+# Список задач сторінками; без фільтрів - усі задачі, від найновіших
+@router.get("/", response_model=TaskPageSchema)
+async def list_tasks(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = Query(None),  # next_cursor з попередньої сторінки
+    sort: Literal["newest", "oldest"] = Query("newest"),
+    status: Optional[str] = Query(None),
+    startup_id: Optional[int] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
+    session: AsyncSession = Depends(get_async_session),
+):
+    filters = []
+    if status is not None:
+        filters.append(task.c.status == status)
+    if startup_id is not None:
+        filters.append(task.c.startup_id == startup_id)
+    # created_at у БД без часового поясу (UTC)
+    if created_after is not None:
+        filters.append(task.c.created_at >= created_after.replace(tzinfo=None))
+    if created_before is not None:
+        filters.append(task.c.created_at < created_before.replace(tzinfo=None))
+
+    # Версія вибірки з тих самих індексів, що й сама сторінка: count(*) ловить видалення,
+    # max(id) - нові задачі, max(updated_at) - зміни існуючих
+    marker_result = await session.execute(
+        select(func.count(), func.max(task.c.id), func.max(task.c.updated_at)).where(*filters)
+    )
+    not_modified = check_not_modified(request, response,
+                                      make_etag("tasks", *marker_result.one(), str(request.query_params)),
+                                      PUBLIC_REVALIDATE_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+
+    stmt = (
         select(
             task.c.id,
             task.c.title,
-            task.c.description,
             task.c.created_at,
             task.c.status,
+            task.c.startup_id,
             user_table.c.username.label("owner_name")
         ).join(user_table, user_table.c.id == task.c.customer_id)
+        .where(*filters)
+    )
+    # id зростає разом із created_at, тож курсор по id дає той самий порядок, що й за датою
+    if sort == "oldest":
+        if cursor is not None:
+            stmt = stmt.where(task.c.id > cursor)
+        stmt = stmt.order_by(task.c.id.asc())
+    else:
+        if cursor is not None:
+            stmt = stmt.where(task.c.id < cursor)
+        stmt = stmt.order_by(task.c.id.desc())
+
+    result = await session.execute(stmt.limit(limit + 1))
+    rows = result.mappings().fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return TaskPageSchema(
+        # created_at у БД без часового поясу - віддаємо з UTC-зміщенням, як у каталозі стартапів
+        tasks=[TaskSummarySchema(**{**row, "created_at": ensure_aware_utc(row["created_at"])}) for row in rows],
+        next_cursor=str(rows[-1]["id"]) if has_more else None,
     )
-    rows = result.fetchall()
-
-    task_list = []
-    for row in rows:
-        row_dict = {
-            "id": row.id,
-            "title": row.title,
-            "description": row.description,
-            "created_at": row.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            "status": row.status,
-            "owner_name": row.owner_name
-        }
-        task_list.append(TaskDetailSchema(**row_dict))
-
-    return task_list
 
 
 # FastAPI Users setup
@@ -114,13 +178,7 @@ async def take_task(
     )
     await session.execute(stmt)
     await session.commit()
+    await public_cache.invalidate(CATALOG_TAG, task_tag(task_id))
 
-    result_user = await session.execute(
-        select(user_table.c.username).where(user_table.c.id == user.id)
-    )
-    user_row = result_user.first()
-
-    if not user_row:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    return {"message": "Task successfully taken", "executor_name": user_row.username}
+    # Ім'я вже є в об'єкті поточного користувача - окремий запит не потрібен
+    return {"message": "Task successfully taken", "executor_name": user.username}
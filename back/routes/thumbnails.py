@@ -0,0 +1,143 @@
+# routes/thumbnails.py
+import asyncio
+import mimetypes
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Set
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
+
+from config import THUMBNAIL_WORKERS
+from routes.blob_store import THUMBNAIL_SIZES, blob_path, thumbnail_path, parse_storage_name
+from routes.file_storage import conditional_file_response
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Без Pillow прев'ю не генеруються, клієнти показують оригінал
+    Image = None
+
+try:
+    import pymupdf  # Необов'язковий - лише для прев'ю першої сторінки PDF
+except ImportError:
+    pymupdf = None
+
+IMAGE_MIME_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff"}
+
+router = APIRouter(
+    prefix="/thumbnails",
+    tags=["thumbnails"]
+)
+
+
+def _render_thumbnails(source_path: str, mime_type: str, sha256: str, sizes):
+    """Виконується в дочірньому процесі: декодує оригінал один раз і зберігає всі розміри у WebP."""
+    # Дублікат уже відрендереного вмісту: перевірка тут, а не в schedule(), щоб не чіпати диск у циклі подій
+    if all(os.path.isfile(thumbnail_path(sha256, size)) for size in sizes):
+        return
+    if mime_type == "application/pdf":
+        with pymupdf.open(source_path) as document:
+            page = document.load_page(0)
+            zoom = max(sizes) / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        image = Image.open(source_path)
+        # JPEG декодується одразу в зменшеному масштабі - мегапіксельне фото не розгортається в пам'яті повністю
+        image.draft("RGB", (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image)
+    image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "PA", "P") else "RGB")
+
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size))  # Лише зменшує, зберігаючи пропорції
+        target_path = thumbnail_path(sha256, size)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        temp_path = f"{target_path}.{os.getpid()}.tmp"
+        image.save(temp_path, "WEBP", quality=80)
+        os.replace(temp_path, target_path)
+
+
+class ThumbnailGenerator:
+    """Генерує прев'ю у пулі процесів, щоб декодування фото не займало event loop і GIL воркера."""
+
+    def __init__(self, max_workers: int = THUMBNAIL_WORKERS):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_progress: Set[str] = set()
+        self._failed: Set[str] = set()  # Биті файли не перегенеровуємо при кожному запиті
+
+    def supports(self, mime_type: Optional[str]) -> bool:
+        if Image is None:
+            return False
+        if mime_type == "application/pdf":
+            return pymupdf is not None
+        return mime_type in IMAGE_MIME_TYPES
+
+    def schedule(self, sha256: str, mime_type: Optional[str]):
+        """Ставить генерацію в чергу й одразу повертається; повторні виклики для того ж вмісту ігноруються."""
+        if not self.supports(mime_type) or sha256 in self._in_progress or sha256 in self._failed:
+            return
+        self.start()
+        self._in_progress.add(sha256)
+        future = asyncio.get_running_loop().run_in_executor(
+            self._pool, _render_thumbnails, blob_path(sha256), mime_type, sha256, THUMBNAIL_SIZES
+        )
+        future.add_done_callback(lambda done: self._on_done(sha256, done))
+
+    def _on_done(self, sha256: str, future: asyncio.Future):
+        self._in_progress.discard(sha256)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self._failed.add(sha256)
+            print(f"Thumbnail generation failed for {sha256}: {error}")
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    async def stop(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await run_in_threadpool(pool.shutdown, wait=True, cancel_futures=True)
+
+
+thumbnail_generator = ThumbnailGenerator()
+
+
+def thumbnail_urls(file_name: Optional[str], mime_type: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """URL прев'ю для кожного розміру ({"240": ..., "480": ...}) або None, якщо для файлу їх не буде."""
+    sha256 = parse_storage_name(file_name)
+    if not sha256:
+        return None  # Старі файли поза blob-сховищем
+    if not thumbnail_generator.supports(mime_type or mimetypes.guess_type(file_name)[0]):
+        return None
+    key = os.path.basename(file_name)
+    return {str(size): f"http://localhost:8000/thumbnails/{size}/{key}" for size in THUMBNAIL_SIZES}
+
+
+@router.get("/{size}/{filename}")
+async def get_thumbnail(size: int, filename: str, request: Request):
+    sha256 = parse_storage_name(filename)
+    if size not in THUMBNAIL_SIZES or not sha256:
+        raise HTTPException(status_code=404, detail="Прев'ю не знайдено")
+
+    path = thumbnail_path(sha256, size)
+    # Файлові перевірки - у пулі потоків, як і решта роботи з диском (file_storage.py)
+    if await run_in_threadpool(os.path.isfile, path):
+        return await conditional_file_response(request, path, f"{sha256}_{size}.webp",
+                                               etag=f'"{sha256}-{size}"', immutable=True,
+                                               media_type="image/webp")
+
+    if not await run_in_threadpool(os.path.isfile, blob_path(sha256)):
+        raise HTTPException(status_code=404, detail="Файл не знайдено")
+    # Прев'ю ще не готове (або загубилось після рестарту) - догенеровуємо у фоні
+    mime_type = mimetypes.guess_type(filename)[0]
+    thumbnail_generator.schedule(sha256, mime_type)
+    if mime_type in IMAGE_MIME_TYPES:
+        # Поки що віддаємо оригінал; редирект не кешується, тож наступний рендер отримає прев'ю
+        return RedirectResponse(f"/chats/attachments/{filename}", status_code=307,
+                                headers={"cache-control": "no-store"})
+    raise HTTPException(status_code=404, detail="Прев'ю ще генерується")
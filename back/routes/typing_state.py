@@ -0,0 +1,36 @@
+# routes/typing_state.py
+import time
+from typing import Dict, Tuple
+
+TYPING_TTL_SECONDS = 5
+PRUNE_INTERVAL_SECONDS = 30
+
+
+class TypingTracker:
+    """Ефемерний стан "друкує...": живе лише в пам'яті й сам зникає через TYPING_TTL_SECONDS."""
+
+    def __init__(self, ttl: float = TYPING_TTL_SECONDS):
+        self.ttl = ttl
+        self.expires_at: Dict[Tuple[int, int], float] = {}  # (chat_id, user_id): monotonic-час завершення
+        self._next_prune_at = time.monotonic() + PRUNE_INTERVAL_SECONDS
+
+    def mark_typing(self, chat_id: int, user_id: int):
+        now = time.monotonic()
+        self.expires_at[(chat_id, user_id)] = now + self.ttl
+        if now >= self._next_prune_at:
+            self._prune(now)
+
+    def clear(self, chat_id: int, user_id: int):
+        self.expires_at.pop((chat_id, user_id), None)
+
+    def is_typing(self, chat_id: int, user_id: int) -> bool:
+        expires_at = self.expires_at.get((chat_id, user_id))
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def _prune(self, now: float):
+        for key in [key for key, expires_at in self.expires_at.items() if expires_at <= now]:
+            del self.expires_at[key]
+        self._next_prune_at = now + PRUNE_INTERVAL_SECONDS
+
+
+typing_tracker = TypingTracker()
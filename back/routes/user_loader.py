@@ -0,0 +1,119 @@
+# routes/user_loader.py
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.database import get_async_session
+from models.models import user as user_table
+
+# last_seen у кеші може відставати на стільки; "онлайн" однаково уточнює presence_tracker з пам'яті
+USER_SUMMARY_TTL_SECONDS = 30
+USER_SUMMARY_CACHE_SIZE = 10000
+
+
+class UserSummary(NamedTuple):
+    id: int
+    username: str
+    last_seen: Optional[datetime]
+
+
+class UserSummaryCache:
+    """Спільний для всіх запитів процесу кеш коротких даних користувачів з TTL."""
+
+    def __init__(self, ttl: float = USER_SUMMARY_TTL_SECONDS, max_entries: int = USER_SUMMARY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple[float, UserSummary]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[UserSummary]:
+        item = self._entries.get(user_id)
+        if item is None:
+            return None
+        expires_at, summary = item
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return summary
+
+    def put(self, summary: UserSummary):
+        self._entries[summary.id] = (time.monotonic() + self.ttl, summary)
+        self._entries.move_to_end(summary.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+user_summary_cache = UserSummaryCache()
+
+
+class UserLoader:
+    """Збирає всі звернення до користувачів протягом запиту в один SELECT ... WHERE id IN (...).
+
+    load() лише реєструє id; запит до БД іде на наступному кроці циклу подій, тож виклики,
+    зроблені до першого await (наприклад, через load_many або asyncio.gather), потрапляють
+    в один запит. Повторний load() того самого id у межах запиту не читає ні БД, ні кеш.
+    Користується сесією запиту - не викликати паралельно з іншими запитами цієї сесії.
+    """
+
+    def __init__(self, session: AsyncSession, cache: UserSummaryCache = user_summary_cache):
+        self.session = session
+        self.cache = cache
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._pending: List[int] = []
+        # Цикл подій тримає на задачі лише слабке посилання - без нашого її може зібрати GC
+        self._dispatch_tasks: Set[asyncio.Task] = set()
+
+    def load(self, user_id: int) -> "asyncio.Future[Optional[UserSummary]]":
+        future = self._futures.get(user_id)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = self._futures[user_id] = loop.create_future()
+        summary = self.cache.get(user_id)
+        if summary is not None:
+            future.set_result(summary)
+            return future
+        self._pending.append(user_id)
+        if len(self._pending) == 1:
+            loop.call_soon(self._start_dispatch)
+        return future
+
+    async def load_many(self, user_ids: Iterable[int]) -> Dict[int, Optional[UserSummary]]:
+        unique_ids = list(dict.fromkeys(user_ids))
+        summaries = await asyncio.gather(*(self.load(user_id) for user_id in unique_ids))
+        return dict(zip(unique_ids, summaries))
+
+    def _start_dispatch(self):
+        task = asyncio.get_running_loop().create_task(self._dispatch())
+        self._dispatch_tasks.add(task)
+        task.add_done_callback(self._dispatch_tasks.discard)
+
+    async def _dispatch(self):
+        user_ids, self._pending = self._pending, []
+        try:
+            result = await self.session.execute(
+                select(user_table.c.id, user_table.c.username, user_table.c.last_seen)
+                .where(user_table.c.id.in_(user_ids))
+            )
+            found = {row.id: UserSummary(row.id, row.username, row.last_seen) for row in result}
+        except Exception as e:
+            for user_id in user_ids:
+                # Наступний load() цього id спробує ще раз
+                self._futures.pop(user_id).set_exception(e)
+            return
+        for user_id in user_ids:
+            summary = found.get(user_id)
+            if summary is not None:
+                self.cache.put(summary)
+            self._futures[user_id].set_result(summary)  # None - користувача не існує
+
+
+async def get_user_loader(session: AsyncSession = Depends(get_async_session)) -> UserLoader:
+    # FastAPI кешує залежність у межах запиту - усі її споживачі отримують той самий UserLoader
+    return UserLoader(session)
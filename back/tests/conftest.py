@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Модулі бекенду імпортуються від каталогу back/ (routes.*, models.*), як і в main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,99 @@
+# tests/test_attachments.py
+import hashlib
+import os
+from email.utils import formatdate
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import chats, taskresult
+from routes.blob_store import storage_name
+
+CONTENT = b"0123456789" * 100
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+BLOB_NAME = storage_name(SHA256, "report.txt")
+ETAG = f'"{SHA256}"'
+
+ATTACHMENT_URLS = [
+    f"/chats/attachments/{BLOB_NAME}",
+    f"/user/download_attachment/{BLOB_NAME}",
+]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    def blob_path(sha256: str) -> str:
+        return os.path.join(tmp_path, sha256)
+
+    with open(blob_path(SHA256), "wb") as blob_file:
+        blob_file.write(CONTENT)
+    monkeypatch.setattr(chats, "blob_path", blob_path)
+    monkeypatch.setattr(taskresult, "blob_path", blob_path)
+
+    app = FastAPI()
+    app.include_router(chats.router)
+    app.include_router(taskresult.router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("url", ATTACHMENT_URLS)
+def test_full_download(client, url):
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == ETAG
+    assert "immutable" in response.headers["cache-control"]
+    assert "last-modified" in response.headers
+
+
+@pytest.mark.parametrize("url", ATTACHMENT_URLS)
+def test_if_none_match_returns_304(client, url):
+    response = client.get(url, headers={"If-None-Match": ETAG})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == ETAG
+
+
+@pytest.mark.parametrize("url", ATTACHMENT_URLS)
+def test_if_modified_since_returns_304(client, url):
+    last_modified = client.get(url).headers["last-modified"]
+
+    response = client.get(url, headers={"If-Modified-Since": last_modified})
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+@pytest.mark.parametrize("url", ATTACHMENT_URLS)
+def test_if_modified_since_before_mtime_returns_file(client, url):
+    response = client.get(url, headers={"If-Modified-Since": formatdate(0, usegmt=True)})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+@pytest.mark.parametrize("url", ATTACHMENT_URLS)
+def test_range_returns_206(client, url):
+    response = client.get(url, headers={"Range": "bytes=10-19", "If-Range": ETAG})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+
+
+@pytest.mark.parametrize("url", ATTACHMENT_URLS)
+def test_if_range_mismatch_returns_full_file(client, url):
+    response = client.get(url, headers={"Range": "bytes=10-19", "If-Range": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+@pytest.mark.parametrize("url", ATTACHMENT_URLS)
+def test_unsatisfiable_range_returns_416(client, url):
+    response = client.get(url, headers={"Range": f"bytes={len(CONTENT) + 10}-{len(CONTENT) + 20}"})
+
+    assert response.status_code == 416
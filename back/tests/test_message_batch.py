@@ -0,0 +1,89 @@
+# tests/test_message_batch.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from models.models import chat, message, message_client_id
+from routes import chats
+from routes.chats import MessageBatchPayload, send_message_batch_endpoint
+
+USER_ID = 1
+CHAT_ID = 10
+
+
+class FakeResult:
+    def __init__(self, rows=(), scalars=()):
+        self._rows = rows
+        self._scalars = scalars
+
+    def mappings(self):
+        return iter(self._rows)
+
+    def scalars(self):
+        return SimpleNamespace(all=lambda: list(self._scalars))
+
+    def __iter__(self):
+        return iter(())
+
+
+class BatchSession:
+    """Відповідає на запити send_message_batch_endpoint так, ніби всі client_id нові."""
+
+    def __init__(self):
+        self.inserted_messages = []
+        self._next_message_id = 100
+
+    async def execute(self, statement):
+        table = getattr(statement, "table", None)
+        if table is message_client_id:
+            rows = statement._multi_values[0]
+            return FakeResult(scalars=[row["client_message_id"] for row in rows])
+        if table is message:
+            self.inserted_messages.extend(statement._multi_values[0])
+            return FakeResult()
+        if statement.columns_clause_froms and statement.columns_clause_froms[0] is chat:
+            return FakeResult(rows=[{"id": CHAT_ID, "user1_id": USER_ID, "user2_id": 2,
+                                     "user1_last_read_message_id": 0, "user2_last_read_message_id": 0}])
+        # Номери з messages_id_seq: generate_series на стільки значень, скільки повідомлень у пакеті
+        count = max(statement.compile().params.values())
+        ids = list(range(self._next_message_id, self._next_message_id + count))
+        self._next_message_id += count
+        return FakeResult(scalars=ids)
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_side_effects(monkeypatch):
+    async def next_chat_change_seq(chat_id, session, count=1):
+        return count
+
+    async def record_new_message(session, chat_id, row, count=1):
+        pass
+
+    async def broadcast_to_chat(message_data, chat_id):
+        pass
+
+    monkeypatch.setattr(chats, "next_chat_change_seq", next_chat_change_seq)
+    monkeypatch.setattr(chats, "record_new_message", record_new_message)
+    monkeypatch.setattr(chats.manager, "broadcast_to_chat", broadcast_to_chat)
+
+
+def test_repeated_client_id_in_one_batch_creates_one_message_and_one_result_per_item():
+    session = BatchSession()
+    payload = MessageBatchPayload(messages=[
+        {"client_id": "a", "chat_id": CHAT_ID, "text": "перше"},
+        {"client_id": "b", "chat_id": CHAT_ID, "text": "друге"},
+        {"client_id": "a", "chat_id": CHAT_ID, "text": "перше ще раз"},
+    ])
+
+    response = asyncio.run(send_message_batch_endpoint(payload, session=session,
+                                                       current_user=SimpleNamespace(id=USER_ID)))
+
+    results = response["results"]
+    assert [(result["client_id"], result["status"]) for result in results] == [
+        ("a", "created"), ("b", "created"), ("a", "rejected")]
+    assert results[0]["message"]["text"] == "перше"
+    assert [row["content"] for row in session.inserted_messages] == ["перше", "друге"]
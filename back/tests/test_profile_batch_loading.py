@@ -0,0 +1,84 @@
+# tests/test_profile_batch_loading.py
+import asyncio
+from collections import namedtuple
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from models.models import comment, startup, task
+from routes.profile import get_user_startups_with_comments_and_tasks
+
+OWNER_ID = 7
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        if not self._rows:
+            return []
+        row_type = namedtuple("Row", self._rows[0].keys())
+        return [row_type(**row) for row in self._rows]
+
+    def mappings(self):
+        return iter(self._rows)
+
+
+class RecordingSession:
+    """Замість БД: записує кожен виконаний запит і віддає рядки за таблицею в SELECT."""
+
+    def __init__(self, rows_by_table):
+        self.rows_by_table = rows_by_table
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        table = statement.columns_clause_froms[0]
+        return FakeResult(self.rows_by_table[table])
+
+
+def make_rows(startup_count: int):
+    created_at = datetime(2026, 1, 1)
+    startups = [
+        {"id": startup_id, "name": f"Startup {startup_id}", "description": None,
+         "created_at": created_at, "owner_id": OWNER_ID}
+        for startup_id in range(1, startup_count + 1)
+    ]
+    tasks = [
+        {"id": startup_id * 10 + n, "title": f"Task {n}", "description": "", "status": "open",
+         "startup_id": startup_id}
+        for startup_id in range(1, startup_count + 1) for n in range(2)
+    ]
+    comments = [
+        {"id": startup_id, "text": "nice", "created_at": created_at, "user_id": 1,
+         "startup_id": startup_id, "author_username": "commenter"}
+        for startup_id in range(1, startup_count + 1)
+    ]
+    return {startup: startups, task: tasks, comment: comments}
+
+
+@pytest.mark.parametrize("startup_count", [1, 10, 200])
+def test_user_startups_use_three_statements_regardless_of_startup_count(startup_count):
+    session = RecordingSession(make_rows(startup_count))
+
+    response = asyncio.run(get_user_startups_with_comments_and_tasks(
+        user=SimpleNamespace(id=OWNER_ID), session=session))
+
+    assert len(session.statements) == 3
+    assert len(response) == startup_count
+    for startup_response in response:
+        assert [t.id for t in startup_response.tasks] == [startup_response.id * 10, startup_response.id * 10 + 1]
+        assert [c.id for c in startup_response.comments] == [startup_response.id]
+        assert startup_response.comments[0].created_at.tzinfo is not None
+
+
+def test_user_without_startups_uses_one_statement():
+    session = RecordingSession({startup: []})
+
+    response = asyncio.run(get_user_startups_with_comments_and_tasks(
+        user=SimpleNamespace(id=OWNER_ID), session=session))
+
+    assert response == []
+    assert len(session.statements) == 1
@@ -0,0 +1,91 @@
+# tests/test_pubsub.py
+import asyncio
+import json
+import uuid
+
+import asyncpg
+import pytest
+
+from auth.database import engine
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from routes.connection_manager import ConnectionManager
+from routes.pubsub import PostgresPubSub
+
+DSN = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+CHAT_ID = 42
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.received = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+        self.received.set()
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def _postgres_available() -> bool:
+    if not DB_HOST:
+        return False
+    try:
+        connection = await asyncpg.connect(DSN, timeout=2)
+    except (OSError, asyncpg.PostgresError, asyncio.TimeoutError):
+        return False
+    await connection.close()
+    return True
+
+
+def test_broadcast_reaches_sockets_of_another_worker():
+    async def scenario():
+        if not await _postgres_available():
+            pytest.skip("Postgres недоступний (DB_HOST/DB_PORT/...)")
+        # Окремий канал, щоб тест не отримував подій запущеного поруч бекенду
+        channel = f"chat_events_test_{uuid.uuid4().hex}"
+        first_pubsub, second_pubsub = PostgresPubSub(DSN, channel), PostgresPubSub(DSN, channel)
+        first_worker, second_worker = ConnectionManager(first_pubsub), ConnectionManager(second_pubsub)
+        await first_pubsub.start()
+        await second_pubsub.start()
+        try:
+            local_socket, remote_socket = FakeWebSocket(), FakeWebSocket()
+            await first_worker.connect(local_socket, 1, [CHAT_ID])
+            await second_worker.connect(remote_socket, 2, [CHAT_ID])
+
+            await first_worker.broadcast_to_chat({"type": "new_message", "content": "hi"}, CHAT_ID)
+
+            await asyncio.wait_for(remote_socket.received.wait(), 5)
+            await asyncio.wait_for(local_socket.received.wait(), 5)
+            assert remote_socket.sent == [{"type": "new_message", "content": "hi"}]
+            assert local_socket.sent == [{"type": "new_message", "content": "hi"}]
+        finally:
+            await first_pubsub.stop()
+            await second_pubsub.stop()
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_reconnect_asks_local_subscribers_to_resync():
+    async def scenario():
+        pubsub = PostgresPubSub("postgresql://unused")
+        manager = ConnectionManager(pubsub)
+        waiter = manager.add_waiter(1, [CHAT_ID])
+        socket = FakeWebSocket()
+        await manager.connect(socket, 2, [])
+
+        async def listen():
+            pass
+        pubsub._listen = listen
+        await pubsub._reconnect()
+
+        assert waiter.take_events() == [{"type": "chat_resync"}]
+        await asyncio.wait_for(socket.received.wait(), 1)
+        assert socket.sent == [{"type": "chat_resync"}]
+
+    asyncio.run(scenario())
@@ -0,0 +1,138 @@
+// Один WebSocket на вкладку: сервер підписує його на всі чати користувача,
+// тож і список чатів, і відкритий чат отримують події з того самого з'єднання.
+// Якщо WebSocket недоступний (наприклад, його ріже проксі), події йдуть через long-poll /chats/updates.
+import axios from 'axios';
+
+const RECONNECT_DELAY_MS = 5000;
+const LONG_POLL_TIMEOUT_SECONDS = 25;
+// Сервер оновлює "онлайн" за кожним кадром від клієнта; ping тримає онлайн навіть неактивну вкладку
+const PING_INTERVAL_MS = 60000;
+
+const listeners = new Set();
+let socket = null;
+let reconnectTimer = null;
+let pingTimer = null;
+let connectedEvent = null; // Остання подія "connected" - для підписників, що з'явилися пізніше
+let longPollController = null;
+let longPollActive = false;
+
+function notify(event) {
+  listeners.forEach(listener => {
+    try {
+      listener(event);
+    } catch (e) {
+      console.error('Помилка обробки події чату', e);
+    }
+  });
+}
+
+function connect() {
+  clearTimeout(reconnectTimer);
+  const jwt = localStorage.getItem('jwtToken');
+  if (!jwt || socket) return;
+  const ws = new WebSocket(`ws://localhost:8000/chats/ws?token=${encodeURIComponent(jwt)}`);
+  ws.onopen = () => {
+    stopLongPoll();
+    clearInterval(pingTimer);
+    pingTimer = setInterval(() => {
+      if (ws.readyState === WebSocket.OPEN) ws.send('ping');
+    }, PING_INTERVAL_MS);
+  };
+  ws.onmessage = (message) => {
+    const event = JSON.parse(message.data);
+    if (event.type === 'connected') connectedEvent = event;
+    notify(event);
+  };
+  ws.onclose = () => {
+    if (socket !== ws) return;
+    socket = null;
+    clearInterval(pingTimer);
+    if (!longPollActive) connectedEvent = null;
+    notify({ type: 'disconnected' });
+    // Поки сокета немає, події приходять через long-poll; паралельно пробуємо перепідключитися
+    if (listeners.size > 0) {
+      longPoll();
+      reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+    }
+  };
+  socket = ws;
+}
+
+async function longPoll() {
+  if (longPollController) return;
+  const controller = new AbortController();
+  longPollController = controller;
+  let cursor = null;
+  while (longPollController === controller) {
+    const jwt = localStorage.getItem('jwtToken');
+    try {
+      const res = await axios.get('http://localhost:8000/chats/updates', {
+        params: cursor ? { cursor, timeout: LONG_POLL_TIMEOUT_SECONDS } : {},
+        headers: { Authorization: `Bearer ${jwt}` },
+        signal: controller.signal,
+      });
+      if (longPollController !== controller) break;
+      longPollActive = true;
+      const { cursor: newCursor, changed, events, user_id: userId, chat_ids: chatIds } = res.data;
+      if (cursor === null) {
+        // Рукостискання: компоненти дотягують пропущене, як і після підключення сокета
+        connectedEvent = { type: 'connected', user_id: userId, chat_ids: chatIds };
+        notify(connectedEvent);
+      } else if (changed) {
+        notify({ type: 'chat_resync' });
+      }
+      events.forEach(notify);
+      cursor = newCursor;
+    } catch (e) {
+      if (longPollController !== controller) break;
+      longPollActive = false;
+      cursor = null;
+      await new Promise(resolve => setTimeout(resolve, RECONNECT_DELAY_MS));
+    }
+  }
+}
+
+function stopLongPoll() {
+  if (longPollController) {
+    longPollController.abort();
+    longPollController = null;
+  }
+  longPollActive = false;
+}
+
+function disconnect() {
+  clearTimeout(reconnectTimer);
+  stopLongPoll();
+  if (socket) {
+    const ws = socket;
+    socket = null;
+    connectedEvent = null;
+    clearInterval(pingTimer);
+    ws.close();
+  }
+}
+
+// Повертає функцію відписки; сокет закривається, коли не лишається жодного підписника
+export function subscribeToChatEvents(listener) {
+  listeners.add(listener);
+  if (connectedEvent) {
+    const event = connectedEvent;
+    setTimeout(() => { if (listeners.has(listener)) listener(event); }, 0);
+  }
+  connect();
+  return () => {
+    listeners.delete(listener);
+    if (listeners.size === 0) disconnect();
+  };
+}
+
+// Чи приходять події наживо (сокетом або long-poll); якщо ні, компоненти опитують сервер самі
+export function isChatSocketOpen() {
+  return (socket !== null && socket.readyState === WebSocket.OPEN) || longPollActive;
+}
+
+export function sendChatSocketEvent(event) {
+  if (socket === null || socket.readyState !== WebSocket.OPEN) return false;
+  socket.send(JSON.stringify(event));
+  return true;
+}